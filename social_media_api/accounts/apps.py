@@ -1,7 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
 
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+        from .models import CachedTokenUser, SignedTokenUser, User
+        from .signals import invalidate_deleted_token, invalidate_user_tokens
+        post_delete.connect(invalidate_deleted_token, sender=Token)
+        # Saves through a proxy send the proxy as the sender
+        for model in (User, SignedTokenUser, CachedTokenUser):
+            post_save.connect(invalidate_user_tokens, sender=model)
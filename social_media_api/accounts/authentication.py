@@ -0,0 +1,184 @@
+"""
+Cached token and signed token authentication.
+
+``TokenAuthentication`` reads ``authtoken_token`` joined to ``accounts_user``
+on every request. ``CachedTokenAuthentication`` keeps each token's user ID
+and ``is_active`` flag in a small per-process LRU and in the shared Django
+cache, so a warm request does no database work. Nothing else about the user
+is cached: ``request.user`` is a ``CachedTokenUser`` whose other fields are
+read from the database the first time a view uses them.
+
+Entries are dropped when a token is deleted (``logout``) and when its user's
+password or ``is_active`` flag is saved. Both caches are cleared in the
+process that made the change; other processes may serve their local copy
+for up to ``AUTH_TOKEN_LOCAL_CACHE_TIMEOUT`` seconds.
+
+``SignedTokenAuthentication`` accepts the signed access tokens issued when
+``AUTH_SIGNED_TOKENS`` is enabled (see ``accounts.tokens``), and rejects
+them once it is turned off.
+"""
+
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+
+from social_media_api.metrics import record_cache
+
+from .models import CachedTokenUser
+from .tokens import InvalidToken, SignedTokenService, signed_tokens_enabled
+
+
+class LocalTokenCache:
+    """A thread-safe, size-bounded LRU of tokens with a per-entry expiry."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, token = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token
+
+    def set(self, key, token, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, token)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication backed by a local LRU and the shared cache.
+    """
+
+    _local = None
+    _stats = Counter()
+    _lock = threading.Lock()
+
+    @classmethod
+    def _local_cache(cls):
+        if cls._local is None:
+            with cls._lock:
+                if cls._local is None:
+                    cls._local = LocalTokenCache(getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_SIZE', 1024))
+        return cls._local
+
+    @staticmethod
+    def _key(key):
+        return f'accounts:token:{key}'
+
+    @classmethod
+    def _record(cls, outcome):
+        with cls._lock:
+            cls._stats[outcome] += 1
+        record_cache('auth_token', outcome != 'misses')
+
+    def _load(self, key):
+        """Return the (user ID, is_active) entry for a token key from the database."""
+        entry = self.get_model().objects.filter(key=key).values_list(
+            'user_id', 'user__is_active'
+        ).first()
+        if entry is None:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+        return entry
+
+    def authenticate_credentials(self, key):
+        local = self._local_cache()
+        entry = local.get(key)
+        if entry is not None:
+            self._record('local_hits')
+        else:
+            entry = cache.get(self._key(key))
+            if entry is not None:
+                self._record('shared_hits')
+            else:
+                self._record('misses')
+                entry = self._load(key)
+                cache.set(self._key(key), entry, getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 300))
+            local.set(key, entry, getattr(settings, 'AUTH_TOKEN_LOCAL_CACHE_TIMEOUT', 5))
+
+        user_id, is_active = entry
+        if not is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        user = CachedTokenUser.from_db(CachedTokenUser.objects.db, ['id', 'is_active'], [user_id, is_active])
+        token = self.get_model().from_db(CachedTokenUser.objects.db, ['key', 'user_id'], [key, user_id])
+        token.user = user
+        return user, token
+
+    @classmethod
+    def invalidate(cls, keys):
+        """Drop tokens from this process's LRU and the shared cache."""
+        keys = list(keys)
+        for key in keys:
+            cls._local_cache().delete(key)
+        cache.delete_many([cls._key(key) for key in keys])
+
+    @classmethod
+    def stats(cls):
+        """Return hit and miss counters for this process."""
+        with cls._lock:
+            stats = dict(cls._stats)
+        lookups = sum(stats.values())
+        hits = stats.get('local_hits', 0) + stats.get('shared_hits', 0)
+        stats['hit_rate'] = hits / lookups if lookups else 0.0
+        return stats
+
+    @classmethod
+    def reset(cls):
+        """Clear this process's LRU and counters."""
+        cls._local_cache().clear()
+        with cls._lock:
+            cls._stats.clear()
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticate ``Authorization: Bearer <access token>`` headers from the
+    token signature alone.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid bearer header.')
+        if not signed_tokens_enabled():
+            raise exceptions.AuthenticationFailed('Signed tokens are disabled.')
+        try:
+            return self.authenticate_credentials(auth[1].decode())
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid bearer header.')
+
+    def authenticate_credentials(self, token):
+        try:
+            return SignedTokenService.verify_access(token), token
+        except InvalidToken as exc:
+            raise exceptions.AuthenticationFailed(str(exc))
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -0,0 +1,63 @@
+"""
+Follow graph scoring for who-to-follow suggestions.
+
+This module is what the ``compute_follow_suggestions`` worker processes run.
+It only uses the standard library and never imports Django, so workers can
+be started with the ``spawn`` method: they get no copies of the parent's
+database connections or locks, and need no Django setup.
+"""
+
+import heapq
+from collections import Counter
+
+
+class FollowGraph:
+    """
+    Out-edges of the follow graph in CSR form.
+
+    Users are numbered by their position in ``user_ids``; the users followed
+    by node ``i`` are ``indices[indptr[i]:indptr[i + 1]]``.
+    """
+
+    def __init__(self, user_ids, indptr, indices):
+        self.user_ids = user_ids
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    def following(self, node):
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def suggest(self, node, limit):
+        """Return up to limit [user_id, mutual_count] pairs for a node, best first."""
+        following = self.following(node)
+        mutuals = Counter()
+        for followed in following:
+            mutuals.update(self.following(followed))
+        mutuals.pop(node, None)
+        for followed in following:
+            mutuals.pop(followed, None)
+        best = heapq.nsmallest(
+            limit, mutuals.items(), key=lambda item: (-item[1], self.user_ids[item[0]])
+        )
+        return [[self.user_ids[candidate], count] for candidate, count in best]
+
+
+_graph = None
+
+
+def init_worker(user_ids, indptr, indices):
+    """Pool initializer: receive the graph's arrays once per worker process."""
+    global _graph
+    _graph = FollowGraph(user_ids, indptr, indices)
+
+
+def suggest_chunk(args):
+    """Score the nodes in [start, stop) of the worker's graph."""
+    start, stop, limit = args
+    return [
+        (_graph.user_ids[node], _graph.suggest(node, limit))
+        for node in range(start, stop)
+    ]
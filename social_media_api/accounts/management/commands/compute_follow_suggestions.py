@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand
+from accounts.suggestions import SuggestionService
+
+
+class Command(BaseCommand):
+    """
+    Recompute who-to-follow suggestions for every user.
+
+    Usage:
+        python manage.py compute_follow_suggestions
+        python manage.py compute_follow_suggestions --processes 8 --chunk-size 5000
+    """
+    help = 'Rank friends-of-friends by mutual follows and store each user\'s suggestions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes scoring the graph'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of users scored per task'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Number of suggestions stored per user'
+        )
+
+    def handle(self, *args, **options):
+        written = SuggestionService.compute(
+            processes=options['processes'],
+            chunk_size=options['chunk_size'],
+            limit=options['limit']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Stored suggestions for {written} users'))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from accounts.renditions import ProfilePictureService
+
+
+class Command(BaseCommand):
+    """
+    Generate profile picture renditions for queued uploads.
+
+    Usage:
+        python manage.py process_profile_pictures            # run forever
+        python manage.py process_profile_pictures --once     # drain and exit
+    """
+    help = 'Generate thumbnail renditions of uploaded profile pictures.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Number of pictures processed per batch'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = ProfilePictureService.process_pending(batch_size=options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} profile pictures'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from accounts.services import FollowService
+
+
+class Command(BaseCommand):
+    """
+    Repair drift in the stored follower and following counts.
+
+    Usage:
+        python manage.py reconcile_follow_counts
+        python manage.py reconcile_follow_counts --batch-size 500
+    """
+    help = 'Recompute stored follower and following counts from the follow edges.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users checked per query'
+        )
+
+    def handle(self, *args, **options):
+        repaired = FollowService.reconcile_counts(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Repaired {repaired} users'))
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:21
+
+import django.db.models.deletion
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def copy_follow_edges(apps, schema_editor):
+    """
+    Copy the rows of the old User.following join table into Follow, then
+    compute the stored follower and following counts from the edges.
+    """
+    User = apps.get_model('accounts', 'User')
+    Follow = apps.get_model('accounts', 'Follow')
+    UserFollowing = User.following.through
+
+    rows = UserFollowing.objects.values_list('from_user_id', 'to_user_id').order_by('pk')
+    batch = []
+    for follower_id, followed_id in rows.iterator(chunk_size=1000):
+        if follower_id == followed_id:
+            continue
+        batch.append(Follow(follower_id=follower_id, followed_id=followed_id))
+        if len(batch) >= 1000:
+            Follow.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def edge_count(field):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+
+    User.objects.update(
+        followers_count=edge_count('followed'),
+        following_count=edge_count('follower'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_remove_user_followers_user_following'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('followed', models.ForeignKey(help_text='The user being followed', on_delete=django.db.models.deletion.CASCADE, related_name='follower_edges', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(help_text='The user who follows', on_delete=django.db.models.deletion.CASCADE, related_name='following_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['followed', 'follower'], name='accounts_fo_followe_6a92d6_idx')],
+                'constraints': [
+                    models.UniqueConstraint(fields=('follower', 'followed'), name='unique_follow'),
+                    models.CheckConstraint(condition=models.Q(('follower', models.F('followed')), _negated=True), name='no_self_follow'),
+                ],
+            },
+        ),
+        migrations.RunPython(copy_follow_edges, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='following',
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following',
+            field=models.ManyToManyField(blank=True, help_text='Users that this user follows', related_name='followers', through='accounts.Follow', through_fields=('follower', 'followed'), to=settings.AUTH_USER_MODEL),
+        ),
+    ]
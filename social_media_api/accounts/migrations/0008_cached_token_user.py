@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:07
+
+import accounts.models
+import django.contrib.auth.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_profile_picture_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CachedTokenUser',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=(accounts.models.PartialUserMixin, 'accounts.user'),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_cached_token_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profilepicturejob',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, help_text='When a worker took the job; older claims are retried', null=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
@@ -5,7 +6,7 @@ from django.db import models
 class User(AbstractUser):
     """
     Custom User model extending Django's AbstractUser.
-    Adds bio, profile_picture, and followers fields for social media functionality.
+    Adds bio, profile_picture, and follow graph fields for social media functionality.
     """
     bio = models.TextField(max_length=500, blank=True, null=True, help_text="User's bio/description")
     profile_picture = models.ImageField(
@@ -16,27 +17,160 @@ class User(AbstractUser):
     )
     following = models.ManyToManyField(
         'self', 
+        through='Follow',
+        through_fields=('follower', 'followed'),
         symmetrical=False, 
         related_name='followers',
         blank=True,
         help_text="Users that this user follows"
     )
+    # {rendition: {format: storage name}}, written by the profile picture worker
+    profile_picture_renditions = models.JSONField(null=True, blank=True)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.username
 
-    @property
-    def followers_count(self):
-        """Return the number of followers."""
-        return self.followers.count()
+    class Meta:
+        db_table = 'accounts_user'
 
-    @property
-    def following_count(self):
-        """Return the number of users this user follows."""
-        return self.following.count()
+
+class Follow(models.Model):
+    """
+    A follow edge: follower follows followed.
+    This is the single follow store; User.following reads through it.
+    """
+    follower = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='following_edges',
+        help_text="The user who follows"
+    )
+    followed = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='follower_edges',
+        help_text="The user being followed"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        db_table = 'accounts_user'
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followed'], name='unique_follow'),
+            models.CheckConstraint(
+                condition=~models.Q(follower=models.F('followed')),
+                name='no_self_follow'
+            ),
+        ]
+        indexes = [
+            # Reverse lookups: who follows a user
+            models.Index(fields=['followed', 'follower']),
+            # Keyset pagination of following and follower lists
+            models.Index(fields=['follower', '-created_at', '-id']),
+            models.Index(fields=['followed', '-created_at', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} follows {self.followed_id}"
+
+
+
+class FollowSuggestion(models.Model):
+    """
+    Precomputed who-to-follow suggestions for a user, written by the
+    compute_follow_suggestions command.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='follow_suggestions'
+    )
+    # [[user_id, mutual_count], ...], best first
+    suggestions = models.JSONField(default=list)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Suggestions for {self.user_id}"
+
+
+class PartialUserMixin:
+    """
+    Loads every deferred field in one query when any of them is touched,
+    rather than one query per field.
+    """
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+
+class SignedTokenUser(PartialUserMixin, User):
+    """
+    A user rebuilt from a signed access token without a database read.
+    Only the fields carried by the token are loaded.
+    """
 
+    class Meta:
+        proxy = True
+
+
+class CachedTokenUser(PartialUserMixin, User):
+    """
+    A user rebuilt from a cached token entry, which carries only the ID and
+    is_active flag. The remaining fields are read fresh when first used.
+    """
+
+    class Meta:
+        proxy = True
+
+
+class ConsumedRefreshToken(models.Model):
+    """
+    A refresh token that has been rotated or revoked. Signed refresh tokens
+    are single use; rows are kept until the token would have expired.
+    """
+    jti = models.CharField(max_length=32, primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return self.jti
+
+
+class ProfilePictureJob(models.Model):
+    """
+    A pending profile picture upload, drained by the
+    process_profile_pictures command.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    source = models.CharField(max_length=255, blank=True, help_text="Storage name of the uploaded picture")
+    # Renditions of the replaced picture, deleted by the worker
+    stale_renditions = models.JSONField(null=True, blank=True)
+    claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When a worker took the job; older claims are retried"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Renditions of {self.source}"
@@ -0,0 +1,8 @@
+from social_media_api.pagination import KeysetPagination
+
+
+class UserDirectoryPagination(KeysetPagination):
+    """
+    Cursor pagination for the user directory, in username order.
+    """
+    ordering = ('username',)
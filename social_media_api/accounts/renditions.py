@@ -0,0 +1,167 @@
+"""
+Profile picture renditions.
+
+``update_profile`` stores the uploaded picture as-is and queues a
+``ProfilePictureJob``; it never decodes the image beyond the upload
+validation. The ``process_profile_pictures`` command drains the queue,
+decoding each picture once with Pillow and writing square thumbnails in
+every size of ``PROFILE_PICTURE_RENDITIONS`` and every format of
+``PROFILE_PICTURE_FORMATS`` through the picture field's storage (local disk
+or ``MediaStorage``). Until a picture's renditions exist, clients fall back
+to the original ``profile_picture`` URL.
+"""
+
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import ProfilePictureJob, User
+
+logger = logging.getLogger(__name__)
+
+FORMAT_EXTENSIONS = {
+    'webp': 'webp',
+    'jpeg': 'jpg',
+}
+
+
+def rendition_sizes():
+    return getattr(settings, 'PROFILE_PICTURE_RENDITIONS', {'small': 64, 'medium': 200, 'large': 512})
+
+
+def rendition_formats():
+    return getattr(settings, 'PROFILE_PICTURE_FORMATS', ('webp', 'jpeg'))
+
+
+def render(file, sizes, formats, quality=85):
+    """
+    Decode an image once and return {(name, format): bytes} of square,
+    centre-cropped thumbnails.
+    """
+    with Image.open(file) as image:
+        # JPEG can decode straight to a reduced scale, far cheaper than full size
+        largest = max(sizes.values())
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image).convert('RGB')
+
+    output = {}
+    for name, size in sizes.items():
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for image_format in formats:
+            buffer = BytesIO()
+            thumbnail.save(buffer, format=image_format.upper(), quality=quality)
+            output[name, image_format] = buffer.getvalue()
+    return output
+
+
+class ProfilePictureService:
+    """
+    Service class for queueing and generating profile picture renditions.
+    """
+
+    @staticmethod
+    def enqueue(user):
+        """
+        Drop a user's renditions after their picture changed, and queue the
+        new picture and the old rendition files for the worker.
+        """
+        stale = User.objects.filter(pk=user.pk).values_list('profile_picture_renditions', flat=True).first()
+        User.objects.filter(pk=user.pk).update(profile_picture_renditions=None)
+        user.profile_picture_renditions = None
+        if user.profile_picture or stale:
+            ProfilePictureJob.objects.create(
+                user_id=user.pk,
+                source=user.profile_picture.name or '',
+                stale_renditions=stale
+            )
+
+    @staticmethod
+    def _delete_files(storage, renditions):
+        for formats in (renditions or {}).values():
+            for name in formats.values():
+                try:
+                    storage.delete(name)
+                except Exception:
+                    logger.exception('Failed to delete profile picture rendition %s', name)
+
+    @staticmethod
+    def process(job):
+        """
+        Delete the replaced renditions and generate the new ones for a job.
+        Returns False if the picture was replaced or removed before the job
+        ran.
+        """
+        storage = User._meta.get_field('profile_picture').storage
+        ProfilePictureService._delete_files(storage, job.stale_renditions)
+        if not job.source or not User.objects.filter(pk=job.user_id, profile_picture=job.source).exists():
+            return False
+
+        with storage.open(job.source, 'rb') as file:
+            images = render(file, rendition_sizes(), rendition_formats())
+
+        stem = os.path.splitext(os.path.basename(job.source))[0]
+        renditions = {}
+        for (name, image_format), content in images.items():
+            extension = FORMAT_EXTENSIONS.get(image_format, image_format)
+            path = f'profile_pictures/renditions/{job.user_id}/{stem}_{name}.{extension}'
+            renditions.setdefault(name, {})[image_format] = storage.save(path, ContentFile(content))
+
+        updated = User.objects.filter(pk=job.user_id, profile_picture=job.source).update(
+            profile_picture_renditions=renditions
+        )
+        if not updated:
+            ProfilePictureService._delete_files(storage, renditions)
+            return False
+        return True
+
+    @staticmethod
+    def claim():
+        """
+        Mark the oldest unclaimed job as taken and return it, or None.
+        Jobs claimed more than PROFILE_PICTURE_JOB_LEASE seconds ago are
+        taken again, so a worker that died mid-job does not strand it.
+        """
+        lease = getattr(settings, 'PROFILE_PICTURE_JOB_LEASE', 600)
+        now = timezone.now()
+        with transaction.atomic():
+            job = (
+                ProfilePictureJob.objects.select_for_update(skip_locked=True)
+                .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=lease)))
+                .order_by('id')
+                .first()
+            )
+            if job is not None:
+                job.claimed_at = now
+                job.save(update_fields=['claimed_at'])
+        return job
+
+    @staticmethod
+    def process_pending(batch_size=10):
+        """
+        Process up to batch_size queued jobs. Each job is claimed in a short
+        transaction, decoded and written to storage outside any transaction,
+        and removed once its result is recorded. Returns the number of jobs
+        handled.
+        """
+        handled = 0
+        for _ in range(batch_size):
+            job = ProfilePictureService.claim()
+            if job is None:
+                break
+            try:
+                ProfilePictureService.process(job)
+            except Exception:
+                # A corrupt or unsupported image is not retried
+                logger.exception('Failed to process profile picture %s', job.source)
+            # Leave the job alone if its lease ran out and another worker took it
+            ProfilePictureJob.objects.filter(pk=job.pk, claimed_at=job.claimed_at).delete()
+            handled += 1
+        return handled
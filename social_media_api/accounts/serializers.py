@@ -1,7 +1,9 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.authtoken.models import Token
+from .tokens import signed_tokens_enabled
 
 User = get_user_model()
 
@@ -36,8 +38,9 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         """
         validated_data.pop('password_confirm')
         user = get_user_model().objects.create_user(**validated_data)
-        # Create a token for the new user
-        Token.objects.create(user=user)
+        # Create a token for the new user, unless signed tokens replace it
+        if not signed_tokens_enabled():
+            Token.objects.create(user=user)
         return user
 
 
@@ -67,23 +70,92 @@ class UserLoginSerializer(serializers.Serializer):
             raise serializers.ValidationError('Must include username and password.')
 
 
+class TokenRefreshSerializer(serializers.Serializer):
+    """
+    Serializer for exchanging a signed refresh token.
+    """
+    refresh = serializers.CharField()
+
+
+class RenditionURLsField(serializers.Field):
+    """
+    Read-only {rendition: {format: url}} for a user's profile picture
+    renditions; null until the worker has generated them.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = User._meta.get_field('profile_picture').storage
+        request = self.context.get('request')
+        build_url = request.build_absolute_uri if request is not None else (lambda url: url)
+        return {
+            rendition: {image_format: build_url(storage.url(name)) for image_format, name in formats.items()}
+            for rendition, formats in value.items()
+        }
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     """
     Serializer for user profile information.
     """
     followers_count = serializers.ReadOnlyField()
     following_count = serializers.ReadOnlyField()
+    profile_picture_renditions = RenditionURLsField()
 
     class Meta:
         model = User
         fields = (
             'id', 'username', 'email', 'first_name', 'last_name', 
-            'bio', 'profile_picture', 'followers_count', 'following_count',
-            'created_at', 'updated_at'
+            'bio', 'profile_picture', 'profile_picture_renditions',
+            'followers_count', 'following_count', 'created_at', 'updated_at'
         )
         read_only_fields = ('id', 'username', 'created_at', 'updated_at')
 
 
+class UserSummarySerializer(serializers.ModelSerializer):
+    """
+    Compact serializer for user lists. Counts are stored columns, so a page
+    costs no extra queries.
+    """
+    profile_picture_renditions = RenditionURLsField()
+
+    class Meta:
+        model = User
+        fields = (
+            'id', 'username', 'first_name', 'last_name', 'profile_picture',
+            'profile_picture_renditions', 'followers_count', 'following_count'
+        )
+        read_only_fields = fields
+
+
+class SuggestedUserSerializer(UserSummarySerializer):
+    """
+    A suggested user with the number of followed users who follow them.
+    """
+    mutual_count = serializers.IntegerField(read_only=True)
+
+    class Meta(UserSummarySerializer.Meta):
+        fields = UserSummarySerializer.Meta.fields + ('mutual_count',)
+        read_only_fields = fields
+
+
+class RelationshipQuerySerializer(serializers.Serializer):
+    """
+    Serializer for a batch of user IDs to look up follow relationships for.
+    """
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False)
+
+    def validate_user_ids(self, value):
+        limit = getattr(settings, 'RELATIONSHIP_LOOKUP_LIMIT', 300)
+        value = list(dict.fromkeys(value))
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} user IDs can be looked up at once.")
+        return value
+
+
 class UserUpdateSerializer(serializers.ModelSerializer):
     """
     Serializer for updating user profile.
@@ -92,3 +164,11 @@ class UserUpdateSerializer(serializers.ModelSerializer):
         model = User
         fields = ('first_name', 'last_name', 'bio', 'profile_picture')
 
+    def update(self, instance, validated_data):
+        # Write only the submitted fields; the rest of request.user may be
+        # stale or not loaded, and the follow counters change without a save
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+
@@ -0,0 +1,130 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Q, Subquery, When
+from django.db.models.functions import Coalesce, Greatest
+from django.contrib.auth import get_user_model
+from .models import Follow
+
+User = get_user_model()
+
+
+class FollowService:
+    """
+    Service class for follow edges and the stored follower/following counts.
+
+    An edge is written with a single conditional INSERT or DELETE, and both
+    users' counters are changed by one UPDATE in the same transaction, so
+    repeated or concurrent requests neither double-count nor deadlock.
+    """
+
+    @staticmethod
+    def is_following(follower, followed):
+        """Return whether follower follows followed, using the unique index."""
+        return Follow.objects.filter(follower=follower, followed=followed).exists()
+
+    @staticmethod
+    def relationships(user, user_ids):
+        """
+        Return {user_id: (following, followed_by)} for a batch of users,
+        read with one query over both follow indexes.
+        """
+        edges = Follow.objects.filter(
+            Q(follower=user, followed_id__in=user_ids) | Q(followed=user, follower_id__in=user_ids)
+        ).values_list('follower_id', 'followed_id')
+        following, followed_by = set(), set()
+        for follower_id, followed_id in edges:
+            if follower_id == user.pk:
+                following.add(followed_id)
+            else:
+                followed_by.add(follower_id)
+        return {
+            user_id: (user_id in following, user_id in followed_by)
+            for user_id in user_ids
+        }
+
+    @staticmethod
+    def _adjust_counts(follower_id, followed_id, delta):
+        # Clamp at zero so a drifted counter never violates the unsigned column
+        User.objects.filter(pk__in=[follower_id, followed_id]).update(
+            following_count=Case(
+                When(pk=follower_id, then=Greatest(F('following_count') + delta, 0)),
+                default=F('following_count'),
+                output_field=IntegerField()
+            ),
+            followers_count=Case(
+                When(pk=followed_id, then=Greatest(F('followers_count') + delta, 0)),
+                default=F('followers_count'),
+                output_field=IntegerField()
+            ),
+        )
+
+    @staticmethod
+    def _following_count(user):
+        return User.objects.filter(pk=user.pk).values_list('following_count', flat=True).first() or 0
+
+    @staticmethod
+    def follow(follower, followed):
+        """
+        Follow a user.
+
+        Returns a (created, following_count) tuple; created is False if the
+        edge already existed.
+        """
+        try:
+            with transaction.atomic():
+                Follow.objects.create(follower=follower, followed=followed)
+                FollowService._adjust_counts(follower.pk, followed.pk, 1)
+        except IntegrityError:
+            return False, FollowService._following_count(follower)
+        return True, FollowService._following_count(follower)
+
+    @staticmethod
+    def unfollow(follower, followed):
+        """
+        Unfollow a user.
+
+        Returns a (deleted, following_count) tuple; deleted is False if there
+        was no edge.
+        """
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(follower=follower, followed=followed).delete()
+            if deleted:
+                FollowService._adjust_counts(follower.pk, followed.pk, -1)
+        return bool(deleted), FollowService._following_count(follower)
+
+    @staticmethod
+    def _edge_count(field):
+        return Coalesce(Subquery(
+            Follow.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+
+    @staticmethod
+    def reconcile_counts(batch_size=1000):
+        """
+        Recompute follower and following counts in primary key ranges and
+        rewrite the users that drifted. Returns the number of repaired users.
+        """
+        repaired = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return repaired
+            last_pk = batch[-1]
+
+            rows = User.objects.filter(pk__in=batch).annotate(
+                actual_followers=FollowService._edge_count('followed'),
+                actual_following=FollowService._edge_count('follower'),
+            ).values_list('pk', 'followers_count', 'following_count', 'actual_followers', 'actual_following')
+            for pk, followers, following, actual_followers, actual_following in rows:
+                if (followers, following) != (actual_followers, actual_following):
+                    User.objects.filter(pk=pk).update(
+                        followers_count=actual_followers,
+                        following_count=actual_following
+                    )
+                    repaired += 1
@@ -0,0 +1,27 @@
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from .authentication import CachedTokenAuthentication
+
+
+def _invalidate_tokens(keys):
+    keys = list(keys)
+    CachedTokenAuthentication.invalidate(keys)
+    # Again after commit, so a concurrent request cannot re-cache the old row
+    transaction.on_commit(lambda: CachedTokenAuthentication.invalidate(keys))
+
+
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Drop a deleted token (logout) from the authentication caches."""
+    _invalidate_tokens([instance.key])
+
+
+# User fields held in, or guarded by, the token caches
+CACHED_USER_FIELDS = frozenset(['password', 'is_active'])
+
+
+def invalidate_user_tokens(sender, instance, created, update_fields=None, **kwargs):
+    """Drop a user's cached tokens when their password or is_active flag may have changed."""
+    if created or (update_fields is not None and not update_fields & CACHED_USER_FIELDS):
+        return
+    _invalidate_tokens(Token.objects.filter(user_id=instance.pk).values_list('key', flat=True))
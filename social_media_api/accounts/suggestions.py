@@ -0,0 +1,128 @@
+"""
+Who-to-follow suggestions.
+
+Suggestions are friends of friends ranked by how many of the people a user
+follows already follow them. They are computed offline by the
+``compute_follow_suggestions`` command: the follow graph is loaded once into
+a compressed sparse row (CSR) adjacency structure, users are scored in
+chunks across worker processes, and each user's ranked list is stored in
+``FollowSuggestion`` and the cache. Serving a user's suggestions is a
+single lookup.
+"""
+
+import multiprocessing
+from array import array
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+from social_media_api.metrics import record_cache
+
+from .graph import FollowGraph, init_worker, suggest_chunk
+from .models import Follow, FollowSuggestion
+
+User = get_user_model()
+
+
+class SuggestionService:
+    """
+    Service class for computing and serving who-to-follow suggestions.
+    """
+
+    @staticmethod
+    def _limit():
+        return getattr(settings, 'FOLLOW_SUGGESTION_LIMIT', 50)
+
+    @staticmethod
+    def _timeout():
+        return getattr(settings, 'FOLLOW_SUGGESTION_CACHE_TIMEOUT', 86400)
+
+    @staticmethod
+    def _key(user_id):
+        return f'accounts:suggestions:{user_id}'
+
+    @staticmethod
+    def load_graph(chunk_size=10000):
+        """Read the follow graph from the database in two streaming queries."""
+        user_ids = array('q', User.objects.order_by('pk').values_list('pk', flat=True).iterator(
+            chunk_size=chunk_size
+        ))
+        position = {user_id: i for i, user_id in enumerate(user_ids)}
+        indptr = array('q', [0]) * (len(user_ids) + 1)
+        indices = array('l')
+
+        # Edges ordered by follower come out grouped by node
+        edges = Follow.objects.order_by('follower_id', 'followed_id').values_list('follower_id', 'followed_id')
+        for follower_id, followed_id in edges.iterator(chunk_size=chunk_size):
+            follower, followed = position.get(follower_id), position.get(followed_id)
+            if follower is None or followed is None:
+                # A user created after the user list was read
+                continue
+            indices.append(followed)
+            indptr[follower + 1] += 1
+        for i in range(len(user_ids)):
+            indptr[i + 1] += indptr[i]
+        return FollowGraph(user_ids, indptr, indices)
+
+    @staticmethod
+    def get(user_id):
+        """Return a user's stored [user_id, mutual_count] suggestions."""
+        key = SuggestionService._key(user_id)
+        suggestions = cache.get(key)
+        record_cache('follow_suggestions', suggestions is not None)
+        if suggestions is None:
+            suggestions = FollowSuggestion.objects.filter(user_id=user_id).values_list(
+                'suggestions', flat=True
+            ).first() or []
+            cache.set(key, suggestions, SuggestionService._timeout())
+        return suggestions
+
+    @staticmethod
+    def _store(results):
+        with transaction.atomic():
+            FollowSuggestion.objects.bulk_create(
+                [FollowSuggestion(user_id=user_id, suggestions=suggestions) for user_id, suggestions in results],
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['suggestions', 'computed_at']
+            )
+        cache.set_many(
+            {SuggestionService._key(user_id): suggestions for user_id, suggestions in results},
+            SuggestionService._timeout()
+        )
+
+    @staticmethod
+    def compute(processes=1, chunk_size=1000, limit=None):
+        """
+        Recompute suggestions for every user.
+
+        The graph is scored in chunks of users by a pool of spawned worker
+        processes that never touch the database or Django (see
+        ``accounts.graph``); this process stores each chunk as it arrives.
+        Returns the number of users written.
+        """
+        limit = limit or SuggestionService._limit()
+        graph = SuggestionService.load_graph()
+        chunks = [
+            (start, min(start + chunk_size, len(graph)), limit)
+            for start in range(0, len(graph), chunk_size)
+        ]
+
+        written = 0
+        arrays = (graph.user_ids, graph.indptr, graph.indices)
+        if processes > 1 and len(chunks) > 1:
+            # Spawned, not forked: workers inherit no database connections or locks
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(processes, initializer=init_worker, initargs=arrays) as pool:
+                for results in pool.imap_unordered(suggest_chunk, chunks):
+                    SuggestionService._store(results)
+                    written += len(results)
+        else:
+            init_worker(*arrays)
+            for chunk in chunks:
+                results = suggest_chunk(chunk)
+                SuggestionService._store(results)
+                written += len(results)
+        return written
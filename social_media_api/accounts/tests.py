@@ -1,9 +1,32 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from io import BytesIO, StringIO
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 from rest_framework.test import APITestCase
+from social_media_api.testing import QueryBudgetMixin
 from rest_framework import status
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.authtoken.models import Token
+from .authentication import CachedTokenAuthentication
+from .models import ConsumedRefreshToken, Follow, FollowSuggestion, ProfilePictureJob, SignedTokenUser
+from . import renditions
+from .renditions import ProfilePictureService
+from .services import FollowService
+from .suggestions import SuggestionService
 
 User = get_user_model()
 
@@ -31,12 +54,40 @@ class UserModelTest(TestCase):
             email='test2@example.com',
             password='testpass123'
         )
-        user2.followers.add(self.user)
+        self.assertEqual(FollowService.follow(self.user, user2), (True, 1))
+        self.assertEqual(FollowService.follow(self.user, user2), (False, 1))
+        self.assertTrue(FollowService.is_following(self.user, user2))
+        self.assertIn(self.user, user2.followers.all())
+        self.user.refresh_from_db()
+        user2.refresh_from_db()
         self.assertEqual(self.user.following_count, 1)
         self.assertEqual(user2.followers_count, 1)
 
+        self.assertEqual(FollowService.unfollow(self.user, user2), (True, 0))
+        self.assertEqual(FollowService.unfollow(self.user, user2), (False, 0))
+        user2.refresh_from_db()
+        self.assertEqual(user2.followers_count, 0)
+
+    def test_self_follow_is_rejected_by_the_database(self):
+        self.assertEqual(FollowService.follow(self.user, self.user), (False, 0))
+
+    def test_reconcile_follow_counts_repairs_drift(self):
+        user2 = User.objects.create_user(
+            username='testuser2',
+            email='test2@example.com',
+            password='testpass123'
+        )
+        Follow.objects.create(follower=self.user, followed=user2)
+        User.objects.filter(pk=self.user.pk).update(followers_count=5)
+
+        out = StringIO()
+        call_command('reconcile_follow_counts', stdout=out)
+        self.assertIn('Repaired 2 users', out.getvalue())
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.followers_count, self.user.following_count), (0, 1))
+
 
-class UserRegistrationAPITest(APITestCase):
+class UserRegistrationAPITest(QueryBudgetMixin, APITestCase):
     def test_user_registration(self):
         url = reverse('register')
         data = {
@@ -67,7 +118,7 @@ class UserRegistrationAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
-class UserLoginAPITest(APITestCase):
+class UserLoginAPITest(QueryBudgetMixin, APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
             username='testuser',
@@ -95,7 +146,7 @@ class UserLoginAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
-class UserProfileAPITest(APITestCase):
+class UserProfileAPITest(QueryBudgetMixin, APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
             username='testuser',
@@ -127,3 +178,513 @@ class UserProfileAPITest(APITestCase):
         self.assertEqual(self.user.first_name, 'Updated')
         self.assertEqual(self.user.bio, 'Updated bio')
 
+
+
+class FollowAPITest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_follow_and_unfollow(self):
+        url = reverse('follow_user', kwargs={'user_id': self.other.pk})
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['following_count'], 1)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.data['following_count'], 1)
+
+        url = reverse('unfollow_user', kwargs={'user_id': self.other.pk})
+        response = self.client.post(url)
+        self.assertEqual(response.data['following_count'], 0)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.followers_count, 0)
+
+
+class UserListAPITest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='aaa',
+            email='aaa@example.com',
+            password='testpass123'
+        )
+        self.others = [
+            User.objects.create_user(
+                username=f'user{i}',
+                email=f'user{i}@example.com',
+                password='testpass123'
+            )
+            for i in range(5)
+        ]
+        for other in self.others:
+            FollowService.follow(self.user, other)
+            FollowService.follow(other, self.user)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def collect(self, url):
+        usernames = []
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            # Token lookup plus one query for the page
+            self.assertLessEqual(len(queries), 2)
+            usernames.extend(user['username'] for user in response.data['results'])
+            url = response.data['next']
+        return usernames
+
+    def test_user_directory_is_paginated_by_username(self):
+        usernames = self.collect(reverse('user_list') + '?page_size=2')
+        self.assertEqual(usernames, ['aaa'] + [f'user{i}' for i in range(5)])
+
+    def test_following_list_is_paginated_most_recent_first(self):
+        usernames = self.collect(reverse('following_list') + '?page_size=2')
+        self.assertEqual(usernames, [f'user{i}' for i in reversed(range(5))])
+
+    def test_followers_list_uses_compact_serializer(self):
+        response = self.client.get(reverse('followers_list'))
+        self.assertEqual(len(response.data['results']), 5)
+        first = response.data['results'][0]
+        self.assertNotIn('email', first)
+        self.assertEqual(first['following_count'], 1)
+
+
+class FollowSuggestionTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(
+                username=name,
+                email=f'{name}@example.com',
+                password='testpass123'
+            )
+            for name in ('alice', 'bob', 'carol', 'dave', 'erin', 'frank')
+        }
+        for follower, followed in [
+            ('alice', 'bob'), ('alice', 'carol'),
+            ('bob', 'dave'), ('bob', 'erin'),
+            ('carol', 'dave'), ('carol', 'alice'),
+            ('frank', 'alice'),
+        ]:
+            FollowService.follow(self.users[follower], self.users[followed])
+        self.alice = self.users['alice']
+        self.token = Token.objects.create(user=self.alice)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_graph_ranks_friends_of_friends_by_mutual_follows(self):
+        graph = SuggestionService.load_graph()
+        node = list(graph.user_ids).index(self.alice.pk)
+        self.assertEqual(graph.suggest(node, 10), [
+            [self.users['dave'].pk, 2],
+            [self.users['erin'].pk, 1],
+        ])
+
+    def test_compute_stores_suggestions_for_every_user(self):
+        out = StringIO()
+        call_command('compute_follow_suggestions', processes=1, chunk_size=2, stdout=out)
+        self.assertIn('Stored suggestions for 6 users', out.getvalue())
+        self.assertEqual(FollowSuggestion.objects.count(), 6)
+        self.assertEqual(
+            FollowSuggestion.objects.get(user=self.users['frank']).suggestions,
+            [[self.users['bob'].pk, 1], [self.users['carol'].pk, 1]]
+        )
+
+    def test_compute_across_processes_matches_single_process(self):
+        SuggestionService.compute(processes=1, chunk_size=2)
+        single = dict(FollowSuggestion.objects.values_list('user_id', 'suggestions'))
+        SuggestionService.compute(processes=2, chunk_size=2)
+        self.assertEqual(dict(FollowSuggestion.objects.values_list('user_id', 'suggestions')), single)
+
+    def test_worker_module_does_not_import_django(self):
+        # Spawned workers import only this module, without Django set up
+        result = subprocess.run(
+            [sys.executable, '-c', "import sys, accounts.graph; print('django' in sys.modules)"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        )
+        self.assertEqual(result.stdout.strip(), 'False')
+
+    def test_suggestions_endpoint_is_a_single_lookup(self):
+        SuggestionService.compute()
+        # Token lookup plus the suggested users; the ranking comes from the cache
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('follow_suggestions'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(user['username'], user['mutual_count']) for user in response.data],
+            [('dave', 2), ('erin', 1)]
+        )
+
+    def test_suggestions_skip_users_followed_since_computation(self):
+        SuggestionService.compute()
+        FollowService.follow(self.alice, self.users['dave'])
+        response = self.client.get(reverse('follow_suggestions'))
+        self.assertEqual([user['username'] for user in response.data], ['erin'])
+
+    def test_suggestions_empty_before_computation(self):
+        response = self.client.get(reverse('follow_suggestions'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+
+class RelationshipAPITest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='viewer',
+            email='viewer@example.com',
+            password='testpass123'
+        )
+        self.others = [
+            User.objects.create_user(
+                username=f'other{i}',
+                email=f'other{i}@example.com',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+        FollowService.follow(self.user, self.others[0])
+        FollowService.follow(self.others[0], self.user)
+        FollowService.follow(self.others[1], self.user)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_relationships_in_one_query(self):
+        ids = [other.pk for other in self.others] + [99999]
+        # Token lookup plus one query on the follow edges
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('relationships'), {'user_ids': ids}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row['user_id'], row['following'], row['followed_by'], row['mutual']) for row in response.data],
+            [
+                (self.others[0].pk, True, True, True),
+                (self.others[1].pk, False, True, False),
+                (self.others[2].pk, False, False, False),
+                (99999, False, False, False),
+            ]
+        )
+
+    @override_settings(RELATIONSHIP_LOOKUP_LIMIT=2)
+    def test_relationships_rejects_oversized_batches(self):
+        response = self.client.post(
+            reverse('relationships'), {'user_ids': [other.pk for other in self.others]}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('user_ids', response.data)
+
+    def test_relationships_requires_user_ids(self):
+        response = self.client.post(reverse('relationships'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CachedTokenAuthenticationTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        CachedTokenAuthentication.reset()
+        self.user = User.objects.create_user(
+            username='cached',
+            email='cached@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def get_profile(self):
+        return self.client.get(reverse('profile'))
+
+    def test_warm_requests_skip_the_token_query(self):
+        self.assertEqual(self.get_profile().status_code, status.HTTP_200_OK)
+        # Only the follower/following count refresh remains
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_profile().status_code, status.HTTP_200_OK)
+        stats = CachedTokenAuthentication.stats()
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_shared_cache_serves_other_processes(self):
+        self.get_profile()
+        CachedTokenAuthentication._local_cache().clear()
+        self.get_profile()
+        self.assertEqual(CachedTokenAuthentication.stats()['shared_hits'], 1)
+
+    def test_logout_invalidates_cached_token(self):
+        self.get_profile()
+        response = self.client.post(reverse('logout'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.get_profile().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_invalidates_cached_token(self):
+        self.get_profile()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_profile().status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_reloads_user(self):
+        self.get_profile()
+        self.user.set_password('newpass456')
+        self.user.save()
+        self.get_profile()
+        self.assertEqual(CachedTokenAuthentication.stats()['misses'], 2)
+
+    def test_profile_reflects_counts_changed_without_save(self):
+        other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpass123'
+        )
+        self.get_profile()
+        FollowService.follow(self.user, other)
+        self.assertEqual(self.get_profile().data['following_count'], 1)
+
+    def test_shared_cache_holds_no_user_fields(self):
+        self.get_profile()
+        entry = cache.get(CachedTokenAuthentication._key(self.token.key))
+        self.assertEqual(entry, (self.user.pk, True))
+
+    def test_profile_update_keeps_counters_changed_since_caching(self):
+        follower = User.objects.create_user(
+            username='follower',
+            email='follower@example.com',
+            password='testpass123'
+        )
+        self.get_profile()
+        FollowService.follow(follower, self.user)
+        response = self.client.patch(reverse('update_profile'), {'bio': 'Updated'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['user']['followers_count'], 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.bio, 'Updated')
+        self.assertEqual(self.user.followers_count, 1)
+
+    def test_profile_update_stores_updated_at(self):
+        earlier = timezone.now() - timedelta(days=1)
+        User.objects.filter(pk=self.user.pk).update(updated_at=earlier)
+        response = self.client.patch(reverse('update_profile'), {'bio': 'Updated'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertGreater(
+            User.objects.values_list('updated_at', flat=True).get(pk=self.user.pk), earlier
+        )
+
+
+@override_settings(AUTH_SIGNED_TOKENS=True)
+class SignedTokenTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='signed',
+            email='signed@example.com',
+            password='testpass123'
+        )
+        self.other = User.objects.create_user(
+            username='target',
+            email='target@example.com',
+            password='testpass123'
+        )
+
+    def login(self):
+        response = self.client.post(reverse('login'), {
+            'username': 'signed',
+            'password': 'testpass123'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def use(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer ' + access)
+
+    def test_login_only_reads_the_user(self):
+        with self.assertNumQueries(1):
+            data = self.login()
+        self.assertIn('access', data)
+        self.assertIn('refresh', data)
+        self.assertNotIn('token', data)
+        self.assertFalse(Token.objects.exists())
+
+    def test_registration_creates_no_api_token(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'newuser',
+            'email': 'newuser@example.com',
+            'password': 'newpass123',
+            'password_confirm': 'newpass123',
+            'first_name': 'New',
+            'last_name': 'User'
+        })
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('access', response.data)
+        self.assertNotIn('token', response.data)
+        self.assertFalse(Token.objects.exists())
+
+    def test_access_tokens_are_rejected_once_signed_tokens_are_disabled(self):
+        self.use(self.login()['access'])
+        with override_settings(AUTH_SIGNED_TOKENS=False):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_access_token_is_verified_without_the_database(self):
+        self.use(self.login()['access'])
+        # One query to load the profile fields the token does not carry
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], 'signed@example.com')
+
+    def test_deactivation_through_token_user_invalidates_cached_tokens(self):
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_200_OK)
+        user = SignedTokenUser.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_access_token_user_works_in_writes(self):
+        self.use(self.login()['access'])
+        response = self.client.post(reverse('follow_user', kwargs={'user_id': self.other.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(FollowService.is_following(self.user, self.other))
+
+    def test_expired_or_tampered_access_token_is_rejected(self):
+        access = self.login()['access']
+        self.use(access + 'x')
+        self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.use(access)
+        with override_settings(AUTH_ACCESS_TOKEN_LIFETIME=-1):
+            self.assertEqual(self.client.get(reverse('profile')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_rotates_and_rejects_reuse(self):
+        refresh = self.login()['refresh']
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.data['refresh'], refresh)
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change_revokes_refresh_tokens(self):
+        refresh = self.login()['refresh']
+        self.user.set_password('newpass456')
+        self.user.save()
+        response = self.client.post(reverse('token_refresh'), {'refresh': refresh})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_refresh_token(self):
+        data = self.login()
+        self.use(data['access'])
+        response = self.client.post(reverse('logout'), {'refresh': data['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(ConsumedRefreshToken.objects.filter(user=self.user).count(), 1)
+        response = self.client.post(reverse('token_refresh'), {'refresh': data['refresh']})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ProfilePictureRenditionTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username='pictured',
+            email='pictured@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, name='avatar.jpg', size=(800, 600)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, format='JPEG')
+        picture = SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+        response = self.client.patch(reverse('update_profile'), {'profile_picture': picture}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_upload_queues_processing_and_returns_original(self):
+        response = self.upload()
+        self.assertIsNone(response.data['user']['profile_picture_renditions'])
+        self.assertIn('avatar', response.data['user']['profile_picture'])
+        self.assertEqual(ProfilePictureJob.objects.count(), 1)
+
+    def test_worker_generates_every_rendition(self):
+        self.upload()
+        out = StringIO()
+        call_command('process_profile_pictures', once=True, stdout=out)
+        self.assertIn('Processed 1 profile pictures', out.getvalue())
+        self.assertFalse(ProfilePictureJob.objects.exists())
+
+        self.user.refresh_from_db()
+        renditions = self.user.profile_picture_renditions
+        self.assertEqual(set(renditions), {'small', 'medium', 'large'})
+        storage = self.user.profile_picture.storage
+        with storage.open(renditions['small']['webp']) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size), ('WEBP', (64, 64)))
+        with storage.open(renditions['large']['jpeg']) as file, Image.open(file) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (512, 512)))
+
+        response = self.client.get(reverse('profile'))
+        urls = response.data['profile_picture_renditions']
+        self.assertTrue(urls['medium']['webp'].endswith('.webp'))
+        self.assertTrue(urls['medium']['jpeg'].endswith('.jpg'))
+
+    def test_picture_is_decoded_outside_the_claim_transaction(self):
+        self.upload()
+        depth = len(connection.savepoint_ids)
+        atomic_depths = []
+        render = renditions.render
+
+        def record_depth(*args, **kwargs):
+            atomic_depths.append(len(connection.savepoint_ids) - depth)
+            return render(*args, **kwargs)
+
+        with mock.patch.object(renditions, 'render', side_effect=record_depth):
+            self.assertEqual(ProfilePictureService.process_pending(), 1)
+        self.assertEqual(atomic_depths, [0])
+        self.assertFalse(ProfilePictureJob.objects.exists())
+
+    @override_settings(PROFILE_PICTURE_JOB_LEASE=600)
+    def test_claimed_jobs_are_skipped_until_their_lease_expires(self):
+        self.upload()
+        job = ProfilePictureJob.objects.get()
+        ProfilePictureJob.objects.filter(pk=job.pk).update(claimed_at=timezone.now())
+        self.assertEqual(ProfilePictureService.process_pending(), 0)
+
+        ProfilePictureJob.objects.filter(pk=job.pk).update(
+            claimed_at=timezone.now() - timedelta(seconds=601)
+        )
+        self.assertEqual(ProfilePictureService.process_pending(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.profile_picture_renditions)
+
+    def test_replaced_picture_is_skipped_and_old_renditions_removed(self):
+        self.upload('first.jpg')
+        ProfilePictureService.process_pending()
+        self.user.refresh_from_db()
+        old = self.user.profile_picture_renditions['small']['jpeg']
+
+        self.upload('second.jpg')
+        self.upload('third.jpg')
+        self.assertEqual(ProfilePictureService.process_pending(), 2)
+        self.user.refresh_from_db()
+        storage = self.user.profile_picture.storage
+        self.assertIn('third', self.user.profile_picture_renditions['small']['jpeg'])
+        self.assertFalse(storage.exists(old))
+        self.assertFalse(any('second' in name for name in os.listdir(
+            os.path.join(self.media_root, 'profile_pictures', 'renditions', str(self.user.pk))
+        )))
@@ -0,0 +1,130 @@
+"""
+Signed access and refresh tokens.
+
+When ``AUTH_SIGNED_TOKENS`` is enabled, login and registration issue a
+short-lived access token and a longer-lived refresh token, both signed with
+``django.core.signing``. Access tokens are verified from the signature and
+timestamp alone, so ``SignedTokenAuthentication`` never reads the database;
+revoking one means waiting out ``AUTH_ACCESS_TOKEN_LIFETIME``. Refresh
+tokens are single use: each refresh records the old token in
+``ConsumedRefreshToken`` and returns a new pair, and a password change or
+deactivation invalidates every outstanding refresh token.
+"""
+
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import ConsumedRefreshToken, SignedTokenUser, User
+
+ACCESS_SALT = 'accounts.tokens.access'
+REFRESH_SALT = 'accounts.tokens.refresh'
+
+# User fields carried in the access token, enough for permission checks
+# and for using request.user in lookups and foreign keys
+ACCESS_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+class InvalidToken(Exception):
+    """A signed token is malformed, expired, revoked or of the wrong type."""
+
+
+def signed_tokens_enabled():
+    return getattr(settings, 'AUTH_SIGNED_TOKENS', False)
+
+
+class SignedTokenService:
+    """
+    Service class for issuing, verifying and rotating signed tokens.
+    """
+
+    @staticmethod
+    def _access_lifetime():
+        return getattr(settings, 'AUTH_ACCESS_TOKEN_LIFETIME', 300)
+
+    @staticmethod
+    def _refresh_lifetime():
+        return getattr(settings, 'AUTH_REFRESH_TOKEN_LIFETIME', 14 * 86400)
+
+    @staticmethod
+    def _password_fingerprint(user):
+        # Changes whenever the password does, revoking older refresh tokens
+        return salted_hmac(REFRESH_SALT, user.password).hexdigest()[:16]
+
+    @staticmethod
+    def _load(token, salt, max_age):
+        try:
+            return signing.loads(token, salt=salt, max_age=max_age)
+        except signing.SignatureExpired:
+            raise InvalidToken('Token has expired.')
+        except signing.BadSignature:
+            raise InvalidToken('Token is invalid.')
+
+    @staticmethod
+    def issue(user):
+        """Return a new access and refresh token pair for a user."""
+        access = signing.dumps(
+            {field: getattr(user, field) for field in ACCESS_FIELDS}, salt=ACCESS_SALT
+        )
+        refresh = signing.dumps({
+            'id': user.pk,
+            'jti': uuid.uuid4().hex,
+            'pwd': SignedTokenService._password_fingerprint(user),
+        }, salt=REFRESH_SALT)
+        return {
+            'access': access,
+            'refresh': refresh,
+            'access_expires_in': SignedTokenService._access_lifetime(),
+        }
+
+    @staticmethod
+    def verify_access(token):
+        """Return the user an access token was issued to, without a database read."""
+        payload = SignedTokenService._load(token, ACCESS_SALT, SignedTokenService._access_lifetime())
+        if set(payload) != set(ACCESS_FIELDS) or not payload['is_active']:
+            raise InvalidToken('Token is invalid.')
+        return SignedTokenUser.from_db(
+            User.objects.db, list(ACCESS_FIELDS), [payload[field] for field in ACCESS_FIELDS]
+        )
+
+    @staticmethod
+    def _consume(token):
+        """Mark a refresh token used and return its user; raises InvalidToken."""
+        payload = SignedTokenService._load(token, REFRESH_SALT, SignedTokenService._refresh_lifetime())
+        user = User.objects.filter(pk=payload.get('id'), is_active=True).first()
+        if user is None or not constant_time_compare(
+            payload.get('pwd', ''), SignedTokenService._password_fingerprint(user)
+        ):
+            raise InvalidToken('Token is invalid.')
+
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                ConsumedRefreshToken.objects.create(
+                    jti=payload['jti'],
+                    user=user,
+                    expires_at=now + timedelta(seconds=SignedTokenService._refresh_lifetime())
+                )
+        except IntegrityError:
+            raise InvalidToken('Token has already been used.')
+        ConsumedRefreshToken.objects.filter(user=user, expires_at__lt=now).delete()
+        return user
+
+    @staticmethod
+    def refresh(token):
+        """Rotate a refresh token, returning a new token pair."""
+        return SignedTokenService.issue(SignedTokenService._consume(token))
+
+    @staticmethod
+    def revoke(token):
+        """Revoke a refresh token. Returns False if it was already invalid."""
+        try:
+            SignedTokenService._consume(token)
+        except InvalidToken:
+            return False
+        return True
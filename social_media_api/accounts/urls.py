@@ -5,12 +5,15 @@ urlpatterns = [
     path('register/', views.register, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout, name='logout'),
+    path('token/refresh/', views.token_refresh, name='token_refresh'),
     path('profile/', views.profile, name='profile'),
     path('profile/update/', views.update_profile, name='update_profile'),
     path('follow/<int:user_id>/', views.follow_user, name='follow_user'),
     path('unfollow/<int:user_id>/', views.unfollow_user, name='unfollow_user'),
     path('following/', views.following_list, name='following_list'),
     path('followers/', views.followers_list, name='followers_list'),
+    path('relationships/', views.relationships, name='relationships'),
+    path('suggestions/', views.follow_suggestions, name='follow_suggestions'),
     path('users/', views.UserListView.as_view(), name='user_list'),
 ]
 
@@ -5,20 +5,43 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token
-from django.contrib.auth import login, get_user_model
-from .models import User
+from django.contrib.auth import get_user_model
+from .models import User, Follow, SignedTokenUser
+from .pagination import UserDirectoryPagination
+from .renditions import ProfilePictureService
+from .suggestions import SuggestionService
 from notifications.services import NotificationService
+from social_media_api.pagination import KeysetPagination
+from social_media_api.querybudget import query_budget
+from posts.services import TimelineService
+from .services import FollowService
+from .tokens import InvalidToken, SignedTokenService, signed_tokens_enabled
 
 User = get_user_model()
 CustomUser = get_user_model()
 from .serializers import (
     UserRegistrationSerializer, 
     UserLoginSerializer, 
+    TokenRefreshSerializer,
     UserProfileSerializer,
+    UserSummarySerializer,
+    SuggestedUserSerializer,
+    RelationshipQuerySerializer,
     UserUpdateSerializer
 )
 
 
+def _issue_credentials(user):
+    """
+    Return the credentials for a user: a signed access/refresh pair when
+    AUTH_SIGNED_TOKENS is enabled, otherwise their API token.
+    """
+    if signed_tokens_enabled():
+        return SignedTokenService.issue(user)
+    token, created = Token.objects.get_or_create(user=user)
+    return {'token': token.key}
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
@@ -30,36 +53,36 @@ def register(request):
     serializer = UserRegistrationSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.save()
-        token, created = Token.objects.get_or_create(user=user)
         return Response({
             'message': 'User registered successfully',
-            'token': token.key,
+            **_issue_credentials(user),
             'user': UserProfileSerializer(user).data
         }, status=status.HTTP_201_CREATED)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(5)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def login_view(request):
     """
-    Login a user and return a token.
+    Login a user and return a token. No session is created; the API only
+    reads tokens.
     
     POST /api/accounts/login/
     """
     serializer = UserLoginSerializer(data=request.data)
     if serializer.is_valid():
         user = serializer.validated_data['user']
-        token, created = Token.objects.get_or_create(user=user)
-        login(request, user)
         return Response({
             'message': 'Login successful',
-            'token': token.key,
+            **_issue_credentials(user),
             'user': UserProfileSerializer(user).data
         }, status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def profile(request):
@@ -68,6 +91,8 @@ def profile(request):
     
     GET /api/accounts/profile/
     """
+    # request.user may come from the token cache; these change without a save
+    request.user.refresh_from_db(fields=['followers_count', 'following_count', 'profile_picture_renditions'])
     serializer = UserProfileSerializer(request.user)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -83,7 +108,10 @@ def update_profile(request):
     partial = request.method == 'PATCH'
     serializer = UserUpdateSerializer(request.user, data=request.data, partial=partial)
     if serializer.is_valid():
-        serializer.save()
+        user = serializer.save()
+        if 'profile_picture' in serializer.validated_data:
+            # Renditions are generated by the process_profile_pictures worker
+            ProfilePictureService.enqueue(user)
         return Response({
             'message': 'Profile updated successfully',
             'user': UserProfileSerializer(request.user).data
@@ -95,10 +123,17 @@ def update_profile(request):
 @permission_classes([IsAuthenticated])
 def logout(request):
     """
-    Logout the current user by deleting their token.
+    Logout the current user by deleting their token. Signed-token clients
+    send their refresh token to revoke it; the access token stays valid
+    until it expires.
     
     POST /api/accounts/logout/
     """
+    if isinstance(request.user, SignedTokenUser):
+        SignedTokenService.revoke(request.data.get('refresh', ''))
+        return Response({
+            'message': 'Logout successful'
+        }, status=status.HTTP_200_OK)
     try:
         request.user.auth_token.delete()
         return Response({
@@ -110,6 +145,27 @@ def logout(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def token_refresh(request):
+    """
+    Exchange a refresh token for a new access and refresh token pair.
+    Each refresh token can be used once.
+    
+    POST /api/accounts/token/refresh/
+    """
+    serializer = TokenRefreshSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        tokens = SignedTokenService.refresh(serializer.validated_data['refresh'])
+    except InvalidToken as exc:
+        return Response({
+            'error': str(exc)
+        }, status=status.HTTP_401_UNAUTHORIZED)
+    return Response(tokens, status=status.HTTP_200_OK)
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def follow_user(request, user_id):
@@ -125,19 +181,20 @@ def follow_user(request, user_id):
                 'error': 'Cannot follow yourself'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        if user_to_follow in request.user.following.all():
+        created, following_count = FollowService.follow(request.user, user_to_follow)
+        if not created:
             return Response({
                 'error': 'Already following this user'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        request.user.following.add(user_to_follow)
+        TimelineService.add_author(request.user, user_to_follow)
         
         # Create notification for the followed user
         NotificationService.create_follow_notification(user_to_follow, request.user)
         
         return Response({
             'message': 'Followed successfully',
-            'following_count': request.user.following_count
+            'following_count': following_count
         }, status=status.HTTP_200_OK)
         
     except User.DoesNotExist:
@@ -161,19 +218,20 @@ def unfollow_user(request, user_id):
                 'error': 'Cannot unfollow yourself'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        if user_to_unfollow not in request.user.following.all():
+        deleted, following_count = FollowService.unfollow(request.user, user_to_unfollow)
+        if not deleted:
             return Response({
                 'error': 'Not following this user'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        request.user.following.remove(user_to_unfollow)
+        TimelineService.remove_author(request.user, user_to_unfollow)
         
         # Create notification for the unfollowed user
         NotificationService.create_unfollow_notification(user_to_unfollow, request.user)
         
         return Response({
             'message': 'Unfollowed successfully',
-            'following_count': request.user.following_count
+            'following_count': following_count
         }, status=status.HTTP_200_OK)
         
     except User.DoesNotExist:
@@ -182,6 +240,22 @@ def unfollow_user(request, user_id):
         }, status=status.HTTP_404_NOT_FOUND)
 
 
+def _paginated_follow_list(request, edges, user_field):
+    """
+    Page through follow edges, most recent first, and serialize the user on
+    the given side of each edge.
+    """
+    edges = edges.select_related(user_field).only(
+        'id', 'created_at',
+        *[f'{user_field}__{field}' for field in UserSummarySerializer.Meta.fields]
+    )
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(edges, request)
+    serializer = UserSummarySerializer([getattr(edge, user_field) for edge in page], many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def following_list(request):
@@ -190,11 +264,12 @@ def following_list(request):
     
     GET /api/accounts/following/
     """
-    following_users = request.user.following.all()
-    serializer = UserProfileSerializer(following_users, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return _paginated_follow_list(
+        request, Follow.objects.filter(follower=request.user), 'followed'
+    )
 
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def followers_list(request):
@@ -203,23 +278,79 @@ def followers_list(request):
     
     GET /api/accounts/followers/
     """
-    followers = request.user.followers.all()
-    serializer = UserProfileSerializer(followers, many=True)
+    return _paginated_follow_list(
+        request, Follow.objects.filter(followed=request.user), 'follower'
+    )
+
+
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def follow_suggestions(request):
+    """
+    Get who-to-follow suggestions, ranked by the number of followed users
+    who follow each suggestion. Suggestions are precomputed by the
+    compute_follow_suggestions command.
+    
+    GET /api/accounts/suggestions/
+    """
+    mutuals = dict(SuggestionService.get(request.user.pk))
+    if not mutuals:
+        return Response([], status=status.HTTP_200_OK)
+
+    # Drop users followed or deactivated since the suggestions were computed
+    users = CustomUser.objects.filter(pk__in=mutuals, is_active=True).exclude(
+        pk__in=Follow.objects.filter(follower=request.user).values('followed_id')
+    ).only(*UserSummarySerializer.Meta.fields)
+    users = sorted(users, key=lambda user: (-mutuals[user.pk], user.pk))
+    for user in users:
+        user.mutual_count = mutuals[user.pk]
+    serializer = SuggestedUserSerializer(users, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@query_budget(2)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def relationships(request):
+    """
+    Get the follow relationship between the current user and a batch of
+    users, for rendering follow buttons in one round trip.
+    
+    POST /api/accounts/relationships/
+    {"user_ids": [2, 3, 5]}
+    """
+    serializer = RelationshipQuerySerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    states = FollowService.relationships(request.user, serializer.validated_data['user_ids'])
+    return Response([
+        {
+            'user_id': user_id,
+            'following': following,
+            'followed_by': followed_by,
+            'mutual': following and followed_by,
+        }
+        for user_id, (following, followed_by) in states.items()
+    ], status=status.HTTP_200_OK)
+
+
 class UserListView(generics.GenericAPIView):
     """
     Generic view for listing users.
     """
     permission_classes = [permissions.IsAuthenticated]
-    serializer_class = UserProfileSerializer
+    serializer_class = UserSummarySerializer
+    pagination_class = UserDirectoryPagination
+    query_budget = 2
     
     def get_queryset(self):
-        return CustomUser.objects.all()
+        return CustomUser.objects.only(*UserSummarySerializer.Meta.fields)
     
     def get(self, request, *args, **kwargs):
         queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
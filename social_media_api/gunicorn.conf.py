@@ -4,6 +4,7 @@ Gunicorn configuration file for production deployment.
 
 import multiprocessing
 import os
+import shutil
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
@@ -11,7 +12,9 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = 'sync'
+# Set to uvicorn.workers.UvicornWorker (with social_media_api.asgi:application)
+# to serve /api/notifications/stream/ without tying up a worker per client
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -43,7 +46,26 @@ certfile = None
 # Preload app for better performance
 preload_app = True
 
+# Prometheus metrics are shared between workers through files in this
+# directory; it must be set before the app (and prometheus_client) is loaded
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus_multiproc')
+
+# Start each run with empty metrics files. This runs as the config is read,
+# before the preloaded app can open files there; the marker stops a config
+# reload (HUP) from deleting the files of running workers.
+if not os.environ.get('PROMETHEUS_MULTIPROC_DIR_RESET'):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+    os.environ['PROMETHEUS_MULTIPROC_DIR_RESET'] = '1'
+
 # Worker lifecycle
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
+
 def when_ready(server):
     server.log.info("Server is ready. Spawning workers")
 
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Notification
+from .services import NotificationService
 
 
 @admin.register(Notification)
@@ -31,12 +32,12 @@ class NotificationAdmin(admin.ModelAdmin):
     
     def mark_as_read(self, request, queryset):
         """Mark selected notifications as read."""
-        updated = queryset.update(is_read=True)
+        updated = NotificationService.set_read_state(queryset, is_read=True)
         self.message_user(request, f'{updated} notifications marked as read.')
     mark_as_read.short_description = "Mark selected notifications as read"
     
     def mark_as_unread(self, request, queryset):
         """Mark selected notifications as unread."""
-        updated = queryset.update(is_read=False)
+        updated = NotificationService.set_read_state(queryset, is_read=False)
         self.message_user(request, f'{updated} notifications marked as unread.')
     mark_as_unread.short_description = "Mark selected notifications as unread"
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+Stored unread-notification counters.
+
+``UserNotificationState.unread_count`` is adjusted in the same transaction
+as every write that changes a notification's read state, and cached per
+user so badge polling reads neither table. Unread means unread as defined
+by ``NotificationQuerySet.unread``, which honours the read watermark. The
+``rebuild_unread_counts`` command repairs drift.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from social_media_api.metrics import record_cache
+
+from .models import Notification, UserNotificationState
+
+
+class UnreadCounter:
+    """
+    Service class for the per-user unread notification counters.
+    """
+
+    @staticmethod
+    def _timeout():
+        return getattr(settings, 'NOTIFICATION_UNREAD_CACHE_TIMEOUT', 60)
+
+    @staticmethod
+    def _key(user_id):
+        return f'notifications:unread:{user_id}'
+
+    @staticmethod
+    def _invalidate(user_ids):
+        keys = [UnreadCounter._key(user_id) for user_id in user_ids]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+    @staticmethod
+    def _count(user_id):
+        return Notification.objects.filter(recipient_id=user_id).unread().count()
+
+    @staticmethod
+    def get(user_id):
+        """Return a user's unread count from the cache or the counter row."""
+        key = UnreadCounter._key(user_id)
+        count = cache.get(key)
+        record_cache('unread_count', count is not None)
+        if count is None:
+            count = UserNotificationState.objects.filter(user_id=user_id).values_list(
+                'unread_count', flat=True
+            ).first()
+            if count is None:
+                count = UnreadCounter.rebuild_user(user_id)
+            cache.set(key, count, UnreadCounter._timeout())
+        return count
+
+    @staticmethod
+    def adjust(deltas):
+        """
+        Apply {user_id: delta} changes to the stored counters.
+
+        A user without a counter row gets one initialised from a full count,
+        which already includes the change being recorded.
+        """
+        changed = [user_id for user_id, delta in deltas.items() if delta]
+        for user_id in changed:
+            delta = deltas[user_id]
+            updated = UserNotificationState.objects.filter(user_id=user_id).update(
+                unread_count=Greatest(F('unread_count') + delta, 0)
+            )
+            if not updated:
+                UnreadCounter.rebuild_user(user_id)
+        if changed:
+            UnreadCounter._invalidate(changed)
+
+    @staticmethod
+    def mark_all_read(user_id, read_up_to):
+        """
+        Move a user's read watermark to read_up_to and clear the counter.
+        A single row write regardless of how many notifications it covers.
+        """
+        UserNotificationState.objects.update_or_create(
+            user_id=user_id, defaults={'unread_count': 0, 'read_up_to': read_up_to}
+        )
+        UnreadCounter._invalidate([user_id])
+
+    @staticmethod
+    def get_read_up_to(user_id):
+        """Return a user's read watermark, or None."""
+        return UserNotificationState.objects.filter(user_id=user_id).values_list(
+            'read_up_to', flat=True
+        ).first()
+
+    @staticmethod
+    def rebuild_user(user_id):
+        """Recount one user's unread notifications and store the result."""
+        count = UnreadCounter._count(user_id)
+        UserNotificationState.objects.update_or_create(
+            user_id=user_id, defaults={'unread_count': count}
+        )
+        UnreadCounter._invalidate([user_id])
+        return count
+
+    @staticmethod
+    def rebuild(user_ids, batch_size=1000):
+        """
+        Recount unread notifications for many users in batches.
+        Returns the number of counters written.
+        """
+        written = 0
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            counts = dict(
+                Notification.objects.filter(recipient_id__in=batch)
+                .unread()
+                .order_by()
+                .values('recipient_id')
+                .annotate(unread=Count('id'))
+                .values_list('recipient_id', 'unread')
+            )
+            with transaction.atomic():
+                UserNotificationState.objects.bulk_create(
+                    [
+                        UserNotificationState(user_id=user_id, unread_count=counts.get(user_id, 0))
+                        for user_id in batch
+                    ],
+                    update_conflicts=True,
+                    unique_fields=['user'],
+                    update_fields=['unread_count', 'updated_at']
+                )
+                UnreadCounter._invalidate(batch)
+            written += len(batch)
+        return written
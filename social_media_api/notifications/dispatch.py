@@ -0,0 +1,381 @@
+"""
+Notification dispatch.
+
+``NotificationService`` hands every notification to a dispatcher backend
+instead of inserting it on the request path. The backend is chosen with
+``settings.NOTIFICATION_DISPATCH_BACKEND``:
+
+- ``immediate``: write the notification synchronously (development, tests)
+- ``inprocess``: queue it in memory and write batches from a background thread
+- ``outbox``: insert a row into ``NotificationOutbox``; the
+  ``process_notification_outbox`` command drains it in batches
+- a dotted path to a custom backend class
+
+Likes and comments on the same target are aggregated at write time: every
+event inside ``NOTIFICATION_AGGREGATION_WINDOW`` seconds is folded into one
+row ("alice and 41 others liked your post") with a single UPSERT.
+"""
+
+import logging
+import operator
+import queue
+import threading
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from functools import reduce
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.db.models.functions import Concat, Greatest
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .counters import UnreadCounter
+from .models import Notification, NotificationOutbox, UserNotificationState
+from .streams import publish_events
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+def _batch_size():
+    return getattr(settings, 'NOTIFICATION_DISPATCH_BATCH_SIZE', 500)
+
+
+def make_event(recipient, actor, verb, target_content_type_id=None, target_object_id=None):
+    """Build a notification event from the users and target involved."""
+    return {
+        'recipient_id': recipient.pk,
+        'actor_id': actor.pk,
+        'verb': verb,
+        'target_content_type_id': target_content_type_id,
+        'target_object_id': target_object_id,
+        'timestamp': timezone.now(),
+    }
+
+
+def is_aggregated(event):
+    """Whether an event is folded into an aggregate notification."""
+    verbs = getattr(settings, 'NOTIFICATION_AGGREGATED_VERBS', ('like', 'comment'))
+    return event['verb'] in verbs and event['target_object_id'] is not None
+
+
+AGGREGATION_FIELDS = (
+    'recipient_id', 'verb', 'target_content_type_id', 'target_object_id', 'window_start',
+)
+
+
+def aggregation_key(event):
+    """Lookup for the aggregate row an event belongs to."""
+    window = getattr(settings, 'NOTIFICATION_AGGREGATION_WINDOW', 86400)
+    seconds = int(event['timestamp'].timestamp())
+    window_start = datetime.fromtimestamp(seconds - seconds % window, tz=dt_timezone.utc)
+    return dict(zip(AGGREGATION_FIELDS, (
+        event['recipient_id'],
+        event['verb'],
+        event['target_content_type_id'],
+        event['target_object_id'],
+        window_start,
+    )))
+
+
+def _aggregate_sql(table):
+    qn = connection.ops.quote_name
+    columns = [
+        'recipient_id', 'actor_id', 'verb', 'target_content_type_id', 'target_object_id',
+        'is_read', 'timestamp', 'created_at', 'actor_count', 'sample_actor_ids', 'window_start',
+    ]
+    conflict = AGGREGATION_FIELDS
+    current = lambda column: f'{qn(table)}.{qn(column)}'
+    # Events drained out of order never move an aggregate back in time
+    latest = lambda column: (
+        f"CASE WHEN excluded.{qn(column)} > {current(column)} "
+        f"THEN excluded.{qn(column)} ELSE {current(column)} END"
+    )
+    # The actor is a repeat if it is the latest actor or already in the sample
+    repeat = (
+        f"({current('actor_id')} = excluded.{qn('actor_id')} OR "
+        f"',' || {current('sample_actor_ids')} || ',' LIKE "
+        f"'%%,' || excluded.{qn('sample_actor_ids')} || ',%%')"
+    )
+    return (
+        f"INSERT INTO {qn(table)} ({', '.join(qn(column) for column in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) "
+        f"ON CONFLICT ({', '.join(qn(column) for column in conflict)}) DO UPDATE SET "
+        f"{qn('actor_count')} = CASE WHEN {repeat} THEN {current('actor_count')} "
+        f"ELSE {current('actor_count')} + 1 END, "
+        f"{qn('sample_actor_ids')} = CASE WHEN {repeat} OR {current('actor_count')} >= %s "
+        f"THEN {current('sample_actor_ids')} "
+        f"ELSE {current('sample_actor_ids')} || ',' || excluded.{qn('sample_actor_ids')} END, "
+        f"{qn('actor_id')} = excluded.{qn('actor_id')}, "
+        f"{qn('is_read')} = excluded.{qn('is_read')}, "
+        f"{qn('timestamp')} = {latest('timestamp')}, "
+        f"{qn('created_at')} = {latest('created_at')}"
+    )
+
+
+def _fold_aggregates(events):
+    """
+    Fold events into their aggregate rows with ORM updates, for databases
+    without the UPSERT used by ``_upsert_aggregates``. Gives the same rows.
+    """
+    sample_size = getattr(settings, 'NOTIFICATION_AGGREGATION_SAMPLE_SIZE', 3)
+    for event in events:
+        key = aggregation_key(event)
+        actor = str(event['actor_id'])
+        # The actor is a repeat if it is the latest actor or already in the sample
+        repeat = (
+            Q(actor_id=event['actor_id']) | Q(sample_actor_ids=actor)
+            | Q(sample_actor_ids__startswith=f'{actor},')
+            | Q(sample_actor_ids__endswith=f',{actor}')
+            | Q(sample_actor_ids__contains=f',{actor},')
+        )
+        latest = {
+            'actor_id': event['actor_id'],
+            'is_read': False,
+            'timestamp': Greatest('timestamp', Value(event['timestamp'])),
+            'created_at': Greatest('created_at', Value(event['timestamp'])),
+        }
+        with transaction.atomic():
+            # sample_actor_ids is assigned before actor_count, so it reads the
+            # old count even where SET clauses see earlier assignments (MySQL)
+            updated = Notification.objects.filter(**key).exclude(repeat).update(
+                sample_actor_ids=Case(
+                    When(
+                        actor_count__lt=sample_size,
+                        then=Concat('sample_actor_ids', Value(f',{actor}'), output_field=CharField()),
+                    ),
+                    default=F('sample_actor_ids'),
+                ),
+                actor_count=F('actor_count') + 1,
+                **latest,
+            )
+            if not updated and not Notification.objects.filter(**key).update(**latest):
+                Notification.objects.get_or_create(**key, defaults={
+                    'actor_id': event['actor_id'],
+                    'timestamp': event['timestamp'],
+                    'created_at': event['timestamp'],
+                    'sample_actor_ids': actor,
+                })
+
+
+def _upsert_aggregates(events):
+    """Fold events into their aggregate rows, one UPSERT per event."""
+    sample_size = getattr(settings, 'NOTIFICATION_AGGREGATION_SAMPLE_SIZE', 3)
+    adapt = connection.ops.adapt_datetimefield_value
+
+    if connection.vendor not in ('sqlite', 'postgresql'):
+        _fold_aggregates(events)
+        return
+
+    params = []
+    for event in events:
+        key = aggregation_key(event)
+        params.append([
+            key['recipient_id'], event['actor_id'], key['verb'],
+            key['target_content_type_id'], key['target_object_id'],
+            False, adapt(event['timestamp']), adapt(event['timestamp']),
+            1, str(event['actor_id']), adapt(key['window_start']),
+            sample_size,
+        ])
+    # executemany runs the rows one by one, so repeated keys in a batch fold correctly
+    with connection.cursor() as cursor:
+        cursor.executemany(_aggregate_sql(Notification._meta.db_table), params)
+
+
+def _is_unread(created_at, read_up_to):
+    return read_up_to is None or created_at > read_up_to
+
+
+def _unread_aggregates(lookup):
+    return set(Notification.objects.filter(lookup).unread().values_list(*AGGREGATION_FIELDS))
+
+
+def write_notifications(events):
+    """
+    Write a batch of notification events.
+
+    Aggregated verbs are folded into their window's row with an UPSERT; the
+    rest are written with bulk inserts. Events whose recipient or actor no
+    longer exists are dropped. Rows take created_at from the event time, and
+    the unread counters move by how many rows actually became unread against
+    the recipient's read watermark. Written events are published to the live
+    streams once the transaction commits. Returns the list of individually
+    created notifications.
+    """
+    if not events:
+        return []
+
+    user_ids = {event['recipient_id'] for event in events} | {event['actor_id'] for event in events}
+    existing = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    events = [
+        event for event in events
+        if event['recipient_id'] in existing and event['actor_id'] in existing
+    ]
+
+    aggregated = [event for event in events if is_aggregated(event)]
+    notifications = [
+        Notification(**event, created_at=event['timestamp'])
+        for event in events if not is_aggregated(event)
+    ]
+
+    with transaction.atomic():
+        read_up_to = dict(
+            UserNotificationState.objects.filter(
+                user_id__in={event['recipient_id'] for event in events}
+            ).values_list('user_id', 'read_up_to')
+        )
+        unread_deltas = Counter(
+            notification.recipient_id for notification in notifications
+            if _is_unread(notification.created_at, read_up_to.get(notification.recipient_id))
+        )
+        if aggregated:
+            # Count the aggregates whose unread state the batch actually changed
+            keys = {tuple(aggregation_key(event).items()) for event in aggregated}
+            lookup = reduce(operator.or_, (Q(**dict(key)) for key in keys))
+            unread_before = _unread_aggregates(lookup)
+            _upsert_aggregates(aggregated)
+            unread_after = _unread_aggregates(lookup)
+            unread_deltas.update(key[0] for key in unread_after - unread_before)
+            unread_deltas.subtract(key[0] for key in unread_before - unread_after)
+        created = Notification.objects.bulk_create(notifications, batch_size=_batch_size())
+        UnreadCounter.adjust(unread_deltas)
+        publish_events(events)
+    return created
+
+
+class ImmediateBackend:
+    """Write each notification synchronously."""
+
+    def enqueue(self, event):
+        created = write_notifications([event])
+        if created:
+            return created[0]
+        if is_aggregated(event):
+            return Notification.objects.filter(**aggregation_key(event)).first()
+        return None
+
+
+class InProcessBackend:
+    """
+    Buffer notifications in memory and write them in batches from a daemon
+    thread. Events still queued when the process dies are lost; use the
+    outbox backend when that matters.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.flush_interval = getattr(settings, 'NOTIFICATION_DISPATCH_FLUSH_INTERVAL', 1.0)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, event):
+        self._ensure_worker()
+        transaction.on_commit(lambda: self.queue.put(event))
+        return None
+
+    def _ensure_worker(self):
+        # Started lazily so a preloaded app forks before the thread exists.
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='notification-dispatcher', daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < _batch_size():
+                    batch.append(self.queue.get(timeout=self.flush_interval))
+            except queue.Empty:
+                pass
+            self._write(batch)
+
+    def _write(self, batch):
+        close_old_connections()
+        try:
+            write_notifications(batch)
+        except Exception:
+            logger.exception('Failed to write %d notifications', len(batch))
+
+    def flush(self):
+        """Write everything currently queued from the calling thread."""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            write_notifications(batch)
+
+
+class OutboxBackend:
+    """Record notifications in the outbox table for a worker to drain."""
+
+    def enqueue(self, event):
+        NotificationOutbox.objects.create(**event)
+        return None
+
+    @staticmethod
+    def drain(batch_size=None):
+        """
+        Move one batch of outbox rows into Notification.
+        Returns the number of outbox rows processed.
+        """
+        batch_size = batch_size or _batch_size()
+        with transaction.atomic():
+            rows = list(
+                NotificationOutbox.objects.select_for_update(skip_locked=True)
+                .order_by('id')[:batch_size]
+            )
+            if not rows:
+                return 0
+            write_notifications([
+                {
+                    'recipient_id': row.recipient_id,
+                    'actor_id': row.actor_id,
+                    'verb': row.verb,
+                    'target_content_type_id': row.target_content_type_id,
+                    'target_object_id': row.target_object_id,
+                    'timestamp': row.timestamp,
+                }
+                for row in rows
+            ])
+            NotificationOutbox.objects.filter(id__in=[row.id for row in rows]).delete()
+        return len(rows)
+
+
+BACKENDS = {
+    'immediate': ImmediateBackend,
+    'inprocess': InProcessBackend,
+    'outbox': OutboxBackend,
+}
+
+_dispatcher = None
+
+
+def get_dispatcher():
+    """Return the process-wide dispatcher backend."""
+    global _dispatcher
+    if _dispatcher is None:
+        name = getattr(settings, 'NOTIFICATION_DISPATCH_BACKEND', 'immediate')
+        backend_class = BACKENDS.get(name) or import_string(name)
+        _dispatcher = backend_class()
+    return _dispatcher
+
+
+@receiver(setting_changed)
+def reset_dispatcher(setting, **kwargs):
+    global _dispatcher
+    if setting == 'NOTIFICATION_DISPATCH_BACKEND':
+        _dispatcher = None
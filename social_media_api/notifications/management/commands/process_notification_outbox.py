@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+from notifications.dispatch import OutboxBackend
+
+
+class Command(BaseCommand):
+    """
+    Drain the notification outbox in batches.
+
+    Usage:
+        python manage.py process_notification_outbox            # run forever
+        python manage.py process_notification_outbox --once     # drain and exit
+    """
+    help = 'Write pending notifications from the outbox using bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of outbox rows written per batch'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the outbox is empty'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the outbox is empty'
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = OutboxBackend.drain(batch_size=options['batch_size'])
+            total += processed
+            if processed:
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {total} notifications'))
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from notifications.services import NotificationRetentionService
+
+
+class Command(BaseCommand):
+    """
+    Apply the notification retention policy.
+
+    Usage:
+        python manage.py prune_notifications
+        python manage.py prune_notifications --batch-size 500 --sleep 0.5
+        python manage.py prune_notifications --dry-run
+    """
+    help = (
+        'Archive expired notifications, delete notifications whose target was '
+        'deleted and drop expired archive months.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'NOTIFICATION_PRUNE_BATCH_SIZE', 1000),
+            help='Number of rows moved or deleted per transaction'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=getattr(settings, 'NOTIFICATION_PRUNE_SLEEP', 0.1),
+            help='Seconds to pause between batches'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many rows each step would touch'
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            expired = NotificationRetentionService.expired().count()
+            dangling = sum(
+                queryset.count() for _, queryset in NotificationRetentionService.dangling()
+            )
+            archive = NotificationRetentionService.expired_archive().count()
+            self.stdout.write(
+                f'Would archive {expired}, delete {dangling} dangling '
+                f'and drop {archive} archived notifications'
+            )
+            return
+
+        batching = {'batch_size': options['batch_size'], 'sleep': options['sleep']}
+        archived = NotificationRetentionService.archive_expired(**batching)
+        dangling = NotificationRetentionService.delete_dangling(**batching)
+        dropped = NotificationRetentionService.prune_archive(**batching)
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {archived}, deleted {dangling} dangling '
+            f'and dropped {dropped} archived notifications'
+        ))
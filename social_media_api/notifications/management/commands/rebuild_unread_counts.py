@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from notifications.counters import UnreadCounter
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Recompute the stored unread-notification counters.
+
+    Usage:
+        python manage.py rebuild_unread_counts
+        python manage.py rebuild_unread_counts --user alice --batch-size 500
+    """
+    help = 'Recount unread notifications and rewrite the stored per-user counters.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help='Only rebuild the counter of this user (can be repeated)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of users recounted per query'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+
+        written = UnreadCounter.rebuild(
+            users.values_list('id', flat=True).iterator(),
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} unread counters'))
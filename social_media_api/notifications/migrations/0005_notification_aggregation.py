@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:11
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0004_notificationoutbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1, help_text='Number of actors collapsed into this notification'),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='sample_actor_ids',
+            field=models.CharField(blank=True, default='', help_text='Comma-separated IDs of the first few actors', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='window_start',
+            field=models.DateTimeField(blank=True, help_text='Start of the aggregation window, empty for single notifications', null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('recipient', 'verb', 'target_content_type', 'target_object_id', 'window_start'), name='notification_aggregate_unique'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_archived_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usernotificationstate',
+            name='read_up_to',
+            field=models.DateTimeField(blank=True, help_text='Notifications created up to this time count as read', null=True),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -7,6 +7,25 @@ from django.utils import timezone
 User = get_user_model()
 
 
+class NotificationQuerySet(models.QuerySet):
+    """
+    A notification is unread when it has not been marked read individually
+    and is newer than its recipient's read_up_to watermark.
+    """
+
+    watermark = models.F('recipient__notification_state__read_up_to')
+
+    def unread(self):
+        return self.filter(
+            models.Q(is_read=False),
+            models.Q(recipient__notification_state__read_up_to__isnull=True)
+            | models.Q(created_at__gt=self.watermark)
+        )
+
+    def read(self):
+        return self.filter(models.Q(is_read=True) | models.Q(created_at__lte=self.watermark))
+
+
 class Notification(models.Model):
     """
     Notification model for tracking user notifications.
@@ -53,25 +72,63 @@ class Notification(models.Model):
         help_text="Whether the notification has been read"
     )
     timestamp = models.DateTimeField(default=timezone.now)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set from the event time, not the write time, so queued events compare
+    # against the read watermark the same way immediate ones do
+    created_at = models.DateTimeField(default=timezone.now)
+    actor_count = models.PositiveIntegerField(
+        default=1,
+        help_text="Number of actors collapsed into this notification"
+    )
+    sample_actor_ids = models.CharField(
+        max_length=255,
+        blank=True,
+        default='',
+        help_text="Comma-separated IDs of the first few actors"
+    )
+    window_start = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Start of the aggregation window, empty for single notifications"
+    )
+
+    objects = NotificationQuerySet.as_manager()
 
     class Meta:
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['recipient', 'is_read']),
             models.Index(fields=['created_at']),
+            models.Index(fields=['recipient', '-created_at', '-id']),
+        ]
+        constraints = [
+            # NULL window_start values never conflict, so only aggregated rows are unique
+            models.UniqueConstraint(
+                fields=['recipient', 'verb', 'target_content_type', 'target_object_id', 'window_start'],
+                name='notification_aggregate_unique'
+            ),
         ]
 
     def __str__(self):
         return f"{self.actor.username} {self.get_verb_display()} - {self.recipient.username}"
 
+    @property
+    def sample_actors(self):
+        """IDs of the first few actors, or just the actor for single notifications."""
+        if not self.sample_actor_ids:
+            return [self.actor_id]
+        return [int(actor_id) for actor_id in self.sample_actor_ids.split(',')]
+
     @property
     def message(self):
         """Generate a human-readable notification message."""
+        actors = self.actor.username
+        if self.actor_count > 1:
+            others = self.actor_count - 1
+            actors = f"{actors} and {others} other{'s' if others > 1 else ''}"
         if self.verb == 'like':
-            return f"{self.actor.username} liked your post"
+            return f"{actors} liked your post"
         elif self.verb == 'comment':
-            return f"{self.actor.username} commented on your post"
+            return f"{actors} commented on your post"
         elif self.verb == 'follow':
             return f"{self.actor.username} started following you"
         elif self.verb == 'unfollow':
@@ -79,6 +136,113 @@ class Notification(models.Model):
         return f"{self.actor.username} {self.get_verb_display()}"
 
     def mark_as_read(self):
-        """Mark the notification as read."""
+        """
+        Mark the notification as read and update the recipient's unread count.
+        Returns False if it was already read.
+        """
+        from .counters import UnreadCounter
+
+        with transaction.atomic():
+            updated = Notification.objects.filter(pk=self.pk).unread().update(is_read=True)
+            if updated:
+                UnreadCounter.adjust({self.recipient_id: -1})
         self.is_read = True
-        self.save(update_fields=['is_read'])
\ No newline at end of file
+        return bool(updated)
+
+
+class NotificationOutbox(models.Model):
+    """
+    Pending notification event written on the request path and turned into
+    Notification rows in batches by the process_notification_outbox worker.
+    """
+    recipient_id = models.BigIntegerField()
+    actor_id = models.BigIntegerField()
+    verb = models.CharField(max_length=50)
+    target_content_type_id = models.IntegerField(null=True, blank=True)
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.verb} for user {self.recipient_id} (pending)"
+
+
+class UserNotificationState(models.Model):
+    """
+    Per-user notification bookkeeping, so the unread badge can be served
+    without counting rows in the notification table.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_state'
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    read_up_to = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Notifications created up to this time count as read"
+    )
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_count} unread"
+
+
+class ArchivedNotification(models.Model):
+    """
+    Notification moved out of the live table by the retention policy.
+
+    Rows are keyed by the month they were created in, so whole months can be
+    dropped once they pass NOTIFICATION_ARCHIVE_RETENTION_DAYS.
+    """
+    original_id = models.BigIntegerField()
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    verb = models.CharField(max_length=50, choices=Notification.NOTIFICATION_TYPES)
+    target_content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    target_object_id = models.PositiveIntegerField(null=True, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    sample_actor_ids = models.CharField(max_length=255, blank=True, default='')
+    is_read = models.BooleanField(default=False)
+    timestamp = models.DateTimeField()
+    created_at = models.DateTimeField()
+    month = models.DateField(help_text="First day of the month the notification was created in")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['month']),
+            models.Index(fields=['recipient', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.verb} for user {self.recipient_id} (archived)"
+
+    @classmethod
+    def from_notification(cls, notification, is_read=None):
+        """Build an archive row from a live notification."""
+        return cls(
+            original_id=notification.pk,
+            recipient_id=notification.recipient_id,
+            actor_id=notification.actor_id,
+            verb=notification.verb,
+            target_content_type_id=notification.target_content_type_id,
+            target_object_id=notification.target_object_id,
+            actor_count=notification.actor_count,
+            sample_actor_ids=notification.sample_actor_ids,
+            is_read=notification.is_read if is_read is None else is_read,
+            timestamp=notification.timestamp,
+            created_at=notification.created_at,
+            month=notification.created_at.date().replace(day=1),
+        )
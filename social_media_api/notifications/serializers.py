@@ -5,7 +5,21 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
-class NotificationSerializer(serializers.ModelSerializer):
+class ReadStateMixin:
+    """
+    Report a notification as read when it was marked read individually or
+    is covered by the recipient's read watermark (``read_up_to`` in the
+    serializer context).
+    """
+
+    def get_is_read(self, obj):
+        if obj.is_read:
+            return True
+        read_up_to = self.context.get('read_up_to')
+        return read_up_to is not None and obj.created_at <= read_up_to
+
+
+class NotificationSerializer(ReadStateMixin, serializers.ModelSerializer):
     """
     Serializer for Notification model.
     """
@@ -13,6 +27,8 @@ class NotificationSerializer(serializers.ModelSerializer):
     actor_first_name = serializers.CharField(source='actor.first_name', read_only=True)
     actor_last_name = serializers.CharField(source='actor.last_name', read_only=True)
     message = serializers.CharField(read_only=True)
+    sample_actors = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+    is_read = serializers.SerializerMethodField()
     target_title = serializers.SerializerMethodField()
 
     class Meta:
@@ -23,6 +39,8 @@ class NotificationSerializer(serializers.ModelSerializer):
             'actor_first_name',
             'actor_last_name',
             'verb',
+            'actor_count',
+            'sample_actors',
             'message',
             'target_title',
             'is_read',
@@ -41,12 +59,14 @@ class NotificationSerializer(serializers.ModelSerializer):
         return None
 
 
-class NotificationListSerializer(serializers.ModelSerializer):
+class NotificationListSerializer(ReadStateMixin, serializers.ModelSerializer):
     """
     Simplified serializer for notification lists.
     """
     actor_username = serializers.CharField(source='actor.username', read_only=True)
     message = serializers.CharField(read_only=True)
+    sample_actors = serializers.ListField(child=serializers.IntegerField(), read_only=True)
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
@@ -54,6 +74,8 @@ class NotificationListSerializer(serializers.ModelSerializer):
             'id',
             'actor_username',
             'verb',
+            'actor_count',
+            'sample_actors',
             'message',
             'is_read',
             'timestamp',
@@ -1,6 +1,14 @@
+import time
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
-from .models import Notification
+from django.db import transaction
+from django.utils import timezone
+from .models import Notification, ArchivedNotification
+from .counters import UnreadCounter
+from .dispatch import get_dispatcher, make_event
 
 User = get_user_model()
 
@@ -15,24 +23,31 @@ class NotificationService:
         """
         Create a notification for a user.
         
+        The notification is handed to the configured dispatcher, so it may be
+        written after this call returns.
+        
         Args:
             recipient: User who receives the notification
             actor: User who performed the action
             verb: Type of action (like, comment, follow, unfollow)
             target: Object the action was performed on (optional)
+        
+        Returns:
+            The Notification when it was written immediately, otherwise None
         """
         # Don't create notification if user is acting on their own content
         if recipient == actor:
             return None
         
-        # Create the notification
-        notification = Notification.objects.create(
-            recipient=recipient,
-            actor=actor,
-            verb=verb,
-            target=target
-        )
-        return notification
+        target_content_type_id = target_object_id = None
+        if target is not None:
+            # get_for_model is served from ContentType's in-process cache
+            target_content_type_id = ContentType.objects.get_for_model(target).pk
+            target_object_id = target.pk
+        
+        return get_dispatcher().enqueue(make_event(
+            recipient, actor, verb, target_content_type_id, target_object_id
+        ))
     
     @staticmethod
     def create_like_notification(post, user):
@@ -82,5 +97,193 @@ class NotificationService:
     
     @staticmethod
     def get_unread_count(user):
-        """Get count of unread notifications for a user."""
-        return Notification.objects.filter(recipient=user, is_read=False).count()
+        """Get count of unread notifications for a user from the stored counter."""
+        return UnreadCounter.get(user.pk)
+    
+    @staticmethod
+    def set_read_state(queryset, is_read=True):
+        """
+        Mark notifications as read (or unread) and update the stored counters.
+        
+        Notifications covered by the recipient's read watermark stay read
+        even when marked unread. Returns the number of rows updated.
+        """
+        with transaction.atomic():
+            pending = queryset.unread() if is_read else queryset.filter(is_read=True)
+            rows = list(
+                pending.select_for_update(of=('self',)).values_list('id', 'recipient_id')
+            )
+            if not rows:
+                return 0
+            ids = [row[0] for row in rows]
+            Notification.objects.filter(id__in=ids).update(is_read=is_read)
+            if is_read:
+                changed = [row[1] for row in rows]
+            else:
+                changed = Notification.objects.filter(id__in=ids).unread().values_list(
+                    'recipient_id', flat=True
+                )
+            sign = -1 if is_read else 1
+            UnreadCounter.adjust({
+                recipient_id: sign * count
+                for recipient_id, count in Counter(changed).items()
+            })
+        return len(rows)
+    
+    @staticmethod
+    def mark_all_as_read(user):
+        """
+        Mark all of a user's notifications as read by moving their read
+        watermark. Returns the number of notifications that were unread.
+        """
+        unread_count = UnreadCounter.get(user.pk)
+        UnreadCounter.mark_all_read(user.pk, timezone.now())
+        return unread_count
+    
+    @staticmethod
+    def get_read_up_to(user):
+        """Get the time up to which all of a user's notifications are read."""
+        return UnreadCounter.get_read_up_to(user.pk)
+
+
+class NotificationRetentionService:
+    """
+    Service class for the notification retention policy.
+    
+    Every step works in small batches, each in its own transaction, and
+    sleeps between batches so it can run while the site is serving traffic.
+    Processed rows leave the live table, so an interrupted run resumes where
+    it stopped when started again.
+    """
+    
+    @staticmethod
+    def _days(name, default):
+        return getattr(settings, name, default)
+    
+    @staticmethod
+    def _unread(rows):
+        """Map the IDs of the unread notifications among rows to their recipients."""
+        return dict(
+            Notification.objects.filter(id__in=[row.id for row in rows])
+            .unread()
+            .values_list('id', 'recipient_id')
+        )
+    
+    @staticmethod
+    def _release_unread(unread):
+        """Take removed unread notifications off their recipients' counters."""
+        UnreadCounter.adjust({
+            recipient_id: -count
+            for recipient_id, count in Counter(unread.values()).items()
+        })
+    
+    @staticmethod
+    def _run_batches(step, queryset, batch_size, sleep):
+        total = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    queryset.order_by('id')
+                    .select_for_update(skip_locked=True, of=('self',))[:batch_size]
+                )
+                if rows:
+                    step(rows)
+            if not rows:
+                return total
+            total += len(rows)
+            if sleep:
+                time.sleep(sleep)
+    
+    @staticmethod
+    def _archive(rows):
+        unread = NotificationRetentionService._unread(rows)
+        ArchivedNotification.objects.bulk_create([
+            ArchivedNotification.from_notification(row, is_read=row.id not in unread)
+            for row in rows
+        ])
+        Notification.objects.filter(id__in=[row.id for row in rows]).delete()
+        NotificationRetentionService._release_unread(unread)
+    
+    @staticmethod
+    def _delete(rows):
+        unread = NotificationRetentionService._unread(rows)
+        Notification.objects.filter(id__in=[row.id for row in rows]).delete()
+        NotificationRetentionService._release_unread(unread)
+    
+    @staticmethod
+    def expired():
+        """Notifications past the retention period: read and unread cutoffs differ."""
+        now = timezone.now()
+        read_cutoff = now - timedelta(days=NotificationRetentionService._days(
+            'NOTIFICATION_READ_RETENTION_DAYS', 30
+        ))
+        unread_cutoff = now - timedelta(days=NotificationRetentionService._days(
+            'NOTIFICATION_UNREAD_RETENTION_DAYS', 180
+        ))
+        return (
+            Notification.objects.filter(created_at__lt=read_cutoff).read()
+            | Notification.objects.filter(created_at__lt=unread_cutoff)
+        )
+    
+    @staticmethod
+    def dangling():
+        """
+        Yield (content type, queryset) pairs of notifications whose target
+        object no longer exists, one query per target content type.
+        """
+        content_type_ids = (
+            Notification.objects.filter(target_content_type__isnull=False)
+            .order_by()
+            .values_list('target_content_type_id', flat=True)
+            .distinct()
+        )
+        for content_type_id in list(content_type_ids):
+            content_type = ContentType.objects.get_for_id(content_type_id)
+            queryset = Notification.objects.filter(target_content_type_id=content_type_id)
+            model = content_type.model_class()
+            if model is not None:
+                queryset = queryset.exclude(
+                    target_object_id__in=model._default_manager.values('pk')
+                )
+            yield content_type, queryset
+    
+    @staticmethod
+    def expired_archive():
+        """Archived notifications in months older than the archive retention period."""
+        cutoff = timezone.now() - timedelta(days=NotificationRetentionService._days(
+            'NOTIFICATION_ARCHIVE_RETENTION_DAYS', 365
+        ))
+        return ArchivedNotification.objects.filter(month__lt=cutoff.date().replace(day=1))
+    
+    @staticmethod
+    def archive_expired(batch_size=1000, sleep=0):
+        """Move expired notifications into the archive. Returns the number moved."""
+        return NotificationRetentionService._run_batches(
+            NotificationRetentionService._archive,
+            NotificationRetentionService.expired(),
+            batch_size, sleep
+        )
+    
+    @staticmethod
+    def delete_dangling(batch_size=1000, sleep=0):
+        """Delete notifications whose target was deleted. Returns the number deleted."""
+        return sum(
+            NotificationRetentionService._run_batches(
+                NotificationRetentionService._delete, queryset, batch_size, sleep
+            )
+            for _, queryset in NotificationRetentionService.dangling()
+        )
+    
+    @staticmethod
+    def prune_archive(batch_size=1000, sleep=0):
+        """Drop archived months past their retention. Returns the number deleted."""
+        queryset = NotificationRetentionService.expired_archive()
+        total = 0
+        while True:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            ArchivedNotification.objects.filter(id__in=ids).delete()
+            total += len(ids)
+            if sleep:
+                time.sleep(sleep)
@@ -0,0 +1,258 @@
+"""
+Live notification streams.
+
+Connected clients subscribe to a broker by user ID and the
+``notification_stream`` view relays whatever is published for them as
+server-sent events. The broker is chosen with
+``settings.NOTIFICATION_STREAM_BACKEND``:
+
+- ``inprocess``: deliver to subscribers in the publishing process only
+  (development, single-process deployments)
+- ``redis``: publish through Redis pub/sub so events written by any web
+  worker or the outbox worker reach clients on every ASGI worker
+- a dotted path to a custom broker class
+
+``EventSource`` cannot send an ``Authorization`` header, so browsers first
+POST for a stream ticket: a signed, single-purpose credential that expires
+after ``NOTIFICATION_STREAM_TICKET_LIFETIME`` seconds. Only the ticket, never
+the API token, appears in the stream URL and in access logs.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    import redis.asyncio as redis_asyncio
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A connected client's queue of pending events.
+
+    Events are put on the queue from any thread through the owning event
+    loop. A client that falls too far behind drops new events rather than
+    growing the queue without bound.
+    """
+
+    def __init__(self, broker, user_id):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(
+            maxsize=getattr(settings, 'NOTIFICATION_STREAM_QUEUE_SIZE', 100)
+        )
+
+    def deliver(self, payload):
+        try:
+            self.loop.call_soon_threadsafe(self._put, payload)
+        except RuntimeError:
+            # The loop has been closed; the client is gone.
+            self.close()
+
+    def _put(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            logger.warning('Dropping notification event for slow client of user %s', self.user_id)
+
+    async def get(self, timeout):
+        """Wait for the next event; raises asyncio.TimeoutError after timeout seconds."""
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """Fan out events to the subscribers connected to this process."""
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Register a subscription; must be called from the client's event loop."""
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, payload):
+        """Deliver a payload to every local subscriber of a user."""
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.deliver(payload)
+
+
+class RedisBroker(InProcessBroker):
+    """
+    Publish events through Redis so every worker sees them.
+
+    Each process holds one pattern subscription and relays messages to its
+    local subscribers, so connected clients do not each hold a Redis
+    connection.
+    """
+
+    def __init__(self):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError('The redis notification stream backend requires the redis package')
+        super().__init__()
+        self.url = getattr(settings, 'NOTIFICATION_STREAM_REDIS_URL', 'redis://127.0.0.1:6379/0')
+        self.prefix = getattr(settings, 'NOTIFICATION_STREAM_CHANNEL_PREFIX', 'notifications:user:')
+        self._client = None
+        self._relays = {}
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        relay = self._relays.get(subscription.loop)
+        if relay is None or relay.done():
+            self._relays[subscription.loop] = subscription.loop.create_task(self._relay())
+        return subscription
+
+    def publish(self, user_id, payload):
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        self._client.publish(f'{self.prefix}{user_id}', json.dumps(payload))
+
+    async def _relay(self):
+        while True:
+            try:
+                client = redis_asyncio.from_url(self.url)
+                pubsub = client.pubsub()
+                await pubsub.psubscribe(f'{self.prefix}*')
+                async for message in pubsub.listen():
+                    if message['type'] != 'pmessage':
+                        continue
+                    channel = message['channel'].decode()
+                    user_id = int(channel[len(self.prefix):])
+                    super().publish(user_id, json.loads(message['data']))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('Notification stream relay lost its Redis connection')
+                await asyncio.sleep(1)
+
+
+BROKERS = {
+    'inprocess': InProcessBroker,
+    'redis': RedisBroker,
+}
+
+_broker = None
+
+
+def get_broker():
+    """Return the process-wide notification stream broker."""
+    global _broker
+    if _broker is None:
+        name = getattr(settings, 'NOTIFICATION_STREAM_BACKEND', 'inprocess')
+        broker_class = BROKERS.get(name) or import_string(name)
+        _broker = broker_class()
+    return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    global _broker
+    if setting == 'NOTIFICATION_STREAM_BACKEND':
+        _broker = None
+
+
+class StreamTicket:
+    """
+    Issue and check the short-lived tickets that authenticate stream requests.
+    """
+    salt = 'notifications.streams.ticket'
+
+    @staticmethod
+    def lifetime():
+        return getattr(settings, 'NOTIFICATION_STREAM_TICKET_LIFETIME', 60)
+
+    @staticmethod
+    def issue(user):
+        """Return a ticket that opens the user's stream."""
+        return signing.dumps({'id': user.pk}, salt=StreamTicket.salt, compress=True)
+
+    @staticmethod
+    def verify(ticket):
+        """Return the active user a ticket was issued to, or None."""
+        try:
+            payload = signing.loads(ticket, salt=StreamTicket.salt, max_age=StreamTicket.lifetime())
+        except signing.BadSignature:
+            return None
+        return get_user_model().objects.filter(pk=payload.get('id'), is_active=True).first()
+
+
+def serialize_event(event):
+    """Turn a notification event into the JSON payload sent to clients."""
+    return {
+        'verb': event['verb'],
+        'actor_id': event['actor_id'],
+        'target_content_type_id': event['target_content_type_id'],
+        'target_object_id': event['target_object_id'],
+        'timestamp': event['timestamp'].isoformat(),
+    }
+
+
+def publish_events(events):
+    """Publish written notification events to their recipients' streams after commit."""
+    payloads = [(event['recipient_id'], serialize_event(event)) for event in events]
+
+    def _publish():
+        broker = get_broker()
+        for user_id, payload in payloads:
+            try:
+                broker.publish(user_id, payload)
+            except Exception:
+                logger.exception('Failed to publish notification event for user %s', user_id)
+
+    if payloads:
+        transaction.on_commit(_publish)
+
+
+async def event_stream(user_id):
+    """
+    Yield server-sent events for a user until the client disconnects.
+
+    A comment line is sent every ``NOTIFICATION_STREAM_HEARTBEAT`` seconds so
+    proxies keep the connection open.
+    """
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT', 15)
+    subscription = get_broker().subscribe(user_id)
+    try:
+        yield 'retry: 5000\n\n'
+        while True:
+            try:
+                payload = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield f'event: notification\ndata: {json.dumps(payload)}\n\n'
+    finally:
+        subscription.close()
@@ -1,3 +1,511 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+import json
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+from accounts.authentication import CachedTokenAuthentication
+from posts.models import Post
+from .dispatch import InProcessBackend, OutboxBackend, _fold_aggregates, make_event, write_notifications
+from .counters import UnreadCounter
+from .models import ArchivedNotification, Notification, NotificationOutbox, UserNotificationState
+from .services import NotificationService, NotificationRetentionService
+from .streams import StreamTicket, get_broker, serialize_event
 
-# Create your tests here.
+User = get_user_model()
+
+
+class NotificationDispatchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.fan = User.objects.create_user(
+            username='fan',
+            email='fan@example.com',
+            password='testpass123'
+        )
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+
+    def test_immediate_backend_writes_notification(self):
+        notification = NotificationService.create_like_notification(self.post, self.fan)
+        self.assertIsNotNone(notification)
+        self.assertEqual(notification.recipient, self.author)
+        self.assertEqual(notification.target, self.post)
+
+    def test_no_notification_for_own_content(self):
+        self.assertIsNone(NotificationService.create_like_notification(self.post, self.author))
+        self.assertFalse(Notification.objects.exists())
+
+    @override_settings(NOTIFICATION_DISPATCH_BACKEND='outbox')
+    def test_outbox_backend_is_drained_by_command(self):
+        self.assertIsNone(NotificationService.create_comment_notification(self.post, self.fan))
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(NotificationOutbox.objects.count(), 1)
+
+        out = StringIO()
+        call_command('process_notification_outbox', '--once', stdout=out)
+        self.assertIn('Processed 1 notifications', out.getvalue())
+        self.assertFalse(NotificationOutbox.objects.exists())
+        notification = Notification.objects.get()
+        self.assertEqual(notification.verb, 'comment')
+        self.assertEqual(notification.target, self.post)
+
+    def test_outbox_drops_events_for_deleted_users(self):
+        OutboxBackend().enqueue(make_event(self.author, self.fan, 'follow'))
+        self.fan.delete()
+        self.assertEqual(OutboxBackend.drain(), 1)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_inprocess_backend_writes_on_flush(self):
+        backend = InProcessBackend()
+        # Keep the worker thread out of the test transaction
+        backend._ensure_worker = lambda: None
+        with self.captureOnCommitCallbacks(execute=True):
+            backend.enqueue(make_event(self.author, self.fan, 'follow'))
+            backend.enqueue(make_event(self.author, self.fan, 'follow'))
+        self.assertFalse(Notification.objects.exists())
+        backend.flush()
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 2)
+
+
+class NotificationAggregationTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.fans = [
+            User.objects.create_user(
+                username=f'fan{i}',
+                email=f'fan{i}@example.com',
+                password='testpass123'
+            )
+            for i in range(5)
+        ]
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+
+    def test_likes_collapse_into_one_row(self):
+        for fan in self.fans:
+            NotificationService.create_like_notification(self.post, fan)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 5)
+        self.assertEqual(notification.actor, self.fans[-1])
+        self.assertEqual(notification.sample_actors, [fan.pk for fan in self.fans[:3]])
+        self.assertEqual(notification.message, 'fan4 and 4 others liked your post')
+
+    def test_repeat_actor_is_not_counted_twice(self):
+        NotificationService.create_like_notification(self.post, self.fans[0])
+        NotificationService.create_like_notification(self.post, self.fans[1])
+        NotificationService.create_like_notification(self.post, self.fans[0])
+        self.assertEqual(Notification.objects.get().actor_count, 2)
+
+    def test_new_activity_marks_aggregate_unread(self):
+        first = NotificationService.create_like_notification(self.post, self.fans[0])
+        first.mark_as_read()
+        NotificationService.create_like_notification(self.post, self.fans[1])
+        self.assertFalse(Notification.objects.get().is_read)
+
+    def like_event(self, actor, verb='like'):
+        content_type = ContentType.objects.get_for_model(Post)
+        return make_event(self.author, actor, verb, content_type.pk, self.post.pk)
+
+    def test_batch_with_repeated_keys_is_folded(self):
+        write_notifications([self.like_event(fan, 'comment') for fan in self.fans])
+        self.assertEqual(Notification.objects.get(verb='comment').actor_count, 5)
+
+    @override_settings(NOTIFICATION_AGGREGATION_WINDOW=60)
+    def test_separate_windows_get_separate_rows(self):
+        first = self.like_event(self.fans[0])
+        later = self.like_event(self.fans[1])
+        later['timestamp'] = first['timestamp'] + timedelta(minutes=5)
+        write_notifications([first, later])
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_orm_fallback_folds_like_the_upsert(self):
+        actors = [*self.fans, self.fans[1], self.fans[1]]
+        _fold_aggregates([self.like_event(fan, 'comment') for fan in actors])
+        write_notifications([self.like_event(fan) for fan in actors])
+
+        fields = ('actor_id', 'actor_count', 'sample_actor_ids', 'is_read')
+        folded = Notification.objects.filter(verb='comment').values(*fields).get()
+        upserted = Notification.objects.filter(verb='like').values(*fields).get()
+        self.assertEqual(folded, upserted)
+        self.assertEqual(folded['actor_count'], 5)
+        self.assertEqual(folded['sample_actor_ids'], ','.join(str(fan.pk) for fan in self.fans[:3]))
+
+    def test_follow_notifications_are_not_aggregated(self):
+        for fan in self.fans[:2]:
+            NotificationService.create_follow_notification(self.author, fan)
+        self.assertEqual(Notification.objects.filter(verb='follow').count(), 2)
+
+
+class UnreadCountTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.fans = [
+            User.objects.create_user(
+                username=f'fan{i}',
+                email=f'fan{i}@example.com',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        self.token = Token.objects.create(user=self.author)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def stored_count(self):
+        return UserNotificationState.objects.get(user=self.author).unread_count
+
+    def unread_count(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.get(reverse('notification-unread-count'))
+        return response.data['unread_count']
+
+    def test_creation_updates_counter(self):
+        for fan in self.fans:
+            NotificationService.create_follow_notification(self.author, fan)
+            NotificationService.create_like_notification(self.post, fan)
+        # Three follows plus one aggregated like notification
+        self.assertEqual(self.stored_count(), 4)
+
+    def test_read_aggregate_counts_again_when_reactivated(self):
+        notification = NotificationService.create_like_notification(self.post, self.fans[0])
+        notification.mark_as_read()
+        self.assertEqual(self.stored_count(), 0)
+        NotificationService.create_like_notification(self.post, self.fans[1])
+        self.assertEqual(self.stored_count(), 1)
+
+    def test_mark_read_paths_update_counter(self):
+        notifications = [
+            NotificationService.create_follow_notification(self.author, fan)
+            for fan in self.fans
+        ]
+        self.assertEqual(self.unread_count(), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('notification-mark-as-read'),
+                {'notification_ids': [notifications[0].id, notifications[0].id]},
+                format='json'
+            )
+        self.assertEqual(self.unread_count(), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notification-mark-single-as-read', args=[notifications[1].id]))
+            self.client.post(reverse('notification-mark-single-as-read', args=[notifications[1].id]))
+        self.assertEqual(self.unread_count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('notification-mark-all-as-read'))
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_badge_polling_does_not_touch_notification_table(self):
+        NotificationService.create_follow_notification(self.author, self.fans[0])
+        self.assertEqual(self.unread_count(), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.unread_count(), 1)
+        table = Notification._meta.db_table
+        self.assertFalse([query for query in queries if table in query['sql']])
+
+    def test_rebuild_command_repairs_drift(self):
+        NotificationService.create_follow_notification(self.author, self.fans[0])
+        UserNotificationState.objects.filter(user=self.author).update(unread_count=7)
+
+        out = StringIO()
+        call_command('rebuild_unread_counts', stdout=out)
+        self.assertIn('Rebuilt 4 unread counters', out.getvalue())
+        self.assertEqual(self.stored_count(), 1)
+        self.assertEqual(UserNotificationState.objects.get(user=self.fans[0]).unread_count, 0)
+
+
+class NotificationListQueryTest(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.author)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def add_notifications(self, start, count):
+        for i in range(start, start + count):
+            fan = User.objects.create_user(
+                username=f'fan{i}',
+                email=f'fan{i}@example.com',
+                password='testpass123'
+            )
+            post = Post.objects.create(author=self.author, title=f'Post {i}', content='Content')
+            NotificationService.create_like_notification(post, fan)
+            NotificationService.create_follow_notification(self.author, fan)
+
+    def count_queries(self):
+        cache.clear()
+        CachedTokenAuthentication.reset()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('notification-list'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.add_notifications(0, 2)
+        small, _ = self.count_queries()
+        self.add_notifications(2, 8)
+        large, response = self.count_queries()
+
+        self.assertEqual(small, large)
+        titles = {item['target_title'] for item in response.data['results'] if item['verb'] == 'like'}
+        self.assertIn('Post 9', titles)
+
+
+class NotificationStreamTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.fan = User.objects.create_user(
+            username='fan',
+            email='fan@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.author)
+        self.url = reverse('notification-stream')
+
+    async def test_stream_requires_authentication(self):
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get(self.url, {'ticket': 'invalid'})
+        self.assertEqual(response.status_code, 401)
+
+    async def test_stream_does_not_accept_api_token_in_query_string(self):
+        response = await self.async_client.get(self.url, {'token': self.token.key})
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_ticket_opens_stream_until_it_expires(self):
+        response = self.client.post(
+            reverse('notification-stream-ticket'), HTTP_AUTHORIZATION=f'Token {self.token.key}'
+        )
+        self.assertEqual(response.status_code, 200)
+        ticket = response.json()['ticket']
+        self.assertNotIn(self.token.key, ticket)
+        self.assertEqual(StreamTicket.verify(ticket), self.author)
+        with override_settings(NOTIFICATION_STREAM_TICKET_LIFETIME=-1):
+            self.assertIsNone(StreamTicket.verify(ticket))
+        self.author.is_active = False
+        self.author.save()
+        self.assertIsNone(StreamTicket.verify(ticket))
+
+    async def test_stream_accepts_ticket(self):
+        ticket = StreamTicket.issue(self.author)
+        response = await self.async_client.get(self.url, {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        await response.streaming_content.aclose()
+
+    def test_stream_requires_asgi(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream_pushes_published_events(self):
+        response = await self.async_client.get(
+            self.url, headers={'authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        content = response.streaming_content
+        first = await anext(content)
+        self.assertTrue(first.startswith(b'retry:'))
+
+        get_broker().publish(self.author.pk, serialize_event(make_event(self.author, self.fan, 'follow')))
+        event = (await anext(content)).decode()
+        await content.aclose()
+
+        self.assertTrue(event.startswith('event: notification\n'))
+        payload = json.loads(event.split('data: ', 1)[1])
+        self.assertEqual(payload['verb'], 'follow')
+        self.assertEqual(payload['actor_id'], self.fan.pk)
+
+    def test_written_notifications_are_published_after_commit(self):
+        published = []
+        broker = get_broker()
+        original = broker.publish
+        broker.publish = lambda user_id, payload: published.append((user_id, payload))
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                NotificationService.create_follow_notification(self.author, self.fan)
+        finally:
+            broker.publish = original
+        self.assertEqual(published[0][0], self.author.pk)
+        self.assertEqual(published[0][1]['verb'], 'follow')
+
+
+class NotificationRetentionTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.fan = User.objects.create_user(
+            username='fan',
+            email='fan@example.com',
+            password='testpass123'
+        )
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+
+    def notify(self, days_old, is_read=False, verb='follow', target=None):
+        content_type = ContentType.objects.get_for_model(target) if target else None
+        notification = Notification.objects.create(
+            recipient=self.author,
+            actor=self.fan,
+            verb=verb,
+            target_content_type=content_type,
+            target_object_id=target.pk if target else None,
+            is_read=is_read
+        )
+        created_at = timezone.now() - timedelta(days=days_old)
+        Notification.objects.filter(pk=notification.pk).update(created_at=created_at)
+        return notification
+
+    def test_prune_archives_expired_and_deletes_dangling(self):
+        old_read = self.notify(60, is_read=True)
+        recent_read = self.notify(1, is_read=True)
+        old_unread = self.notify(60)
+        ancient_unread = self.notify(200)
+        other_post = Post.objects.create(author=self.author, title='Gone', content='Content')
+        dangling = self.notify(1, verb='like', target=other_post)
+        live = self.notify(1, verb='comment', target=self.post)
+        other_post.delete()
+        UnreadCounter.rebuild_user(self.author.pk)
+
+        out = StringIO()
+        call_command('prune_notifications', '--sleep', '0', stdout=out)
+        self.assertIn('Archived 2, deleted 1 dangling', out.getvalue())
+
+        remaining = set(Notification.objects.values_list('id', flat=True))
+        self.assertEqual(remaining, {recent_read.id, old_unread.id, live.id})
+        archived = ArchivedNotification.objects.get(original_id=old_read.id)
+        self.assertEqual(archived.month, archived.created_at.date().replace(day=1))
+        self.assertTrue(ArchivedNotification.objects.filter(original_id=ancient_unread.id).exists())
+        self.assertFalse(ArchivedNotification.objects.filter(original_id=dangling.id).exists())
+        # The archived and deleted unread rows leave the counter
+        self.assertEqual(UserNotificationState.objects.get(user=self.author).unread_count, 2)
+
+    def test_prune_drops_expired_archive_months(self):
+        self.notify(500, is_read=True)
+        NotificationRetentionService.archive_expired()
+        self.assertEqual(ArchivedNotification.objects.count(), 1)
+        self.assertEqual(NotificationRetentionService.prune_archive(), 1)
+
+    def test_dry_run_changes_nothing(self):
+        self.notify(60, is_read=True)
+        out = StringIO()
+        call_command('prune_notifications', '--dry-run', stdout=out)
+        self.assertIn('Would archive 1', out.getvalue())
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+class ReadWatermarkTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.fans = [
+            User.objects.create_user(
+                username=f'fan{i}',
+                email=f'fan{i}@example.com',
+                password='testpass123'
+            )
+            for i in range(3)
+        ]
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        self.token = Token.objects.create(user=self.author)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def mark_all_as_read(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('notification-mark-all-as-read'))
+
+    def test_mark_all_as_read_does_not_update_notification_rows(self):
+        for fan in self.fans:
+            NotificationService.create_follow_notification(self.author, fan)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.mark_all_as_read()
+        self.assertEqual(response.data['updated_count'], 3)
+        table = Notification._meta.db_table
+        self.assertFalse([q for q in queries if q['sql'].startswith('UPDATE') and table in q['sql']])
+        self.assertEqual(Notification.objects.filter(is_read=False).count(), 3)
+        self.assertEqual(Notification.objects.unread().count(), 0)
+
+    def test_list_reports_watermarked_notifications_as_read(self):
+        NotificationService.create_follow_notification(self.author, self.fans[0])
+        self.mark_all_as_read()
+        newer = NotificationService.create_follow_notification(self.author, self.fans[1])
+
+        response = self.client.get(reverse('notification-list'))
+        read_state = {item['id']: item['is_read'] for item in response.data['results']}
+        self.assertEqual(list(read_state.values()).count(True), 1)
+        self.assertFalse(read_state[newer.id])
+
+        response = self.client.get(reverse('notification-list'), {'is_read': 'false'})
+        self.assertEqual([item['id'] for item in response.data['results']], [newer.id])
+        response = self.client.get(reverse('notification-list'), {'is_read': 'true'})
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(UserNotificationState.objects.get(user=self.author).unread_count, 1)
+
+    def test_watermarked_notification_is_already_read(self):
+        notification = NotificationService.create_follow_notification(self.author, self.fans[0])
+        self.mark_all_as_read()
+        response = self.client.post(
+            reverse('notification-mark-single-as-read', args=[notification.id])
+        )
+        self.assertEqual(response.data['message'], 'Notification was already read')
+        self.assertEqual(UserNotificationState.objects.get(user=self.author).unread_count, 0)
+
+    def test_new_activity_on_watermarked_aggregate_counts_again(self):
+        NotificationService.create_like_notification(self.post, self.fans[0])
+        self.mark_all_as_read()
+        NotificationService.create_like_notification(self.post, self.fans[1])
+        self.assertEqual(UserNotificationState.objects.get(user=self.author).unread_count, 1)
+        self.assertEqual(Notification.objects.unread().count(), 1)
+
+    @override_settings(NOTIFICATION_DISPATCH_BACKEND='outbox')
+    def test_events_drained_after_mark_all_as_read_stay_read(self):
+        NotificationService.create_like_notification(self.post, self.fans[0])
+        NotificationService.create_follow_notification(self.author, self.fans[1])
+        self.mark_all_as_read()
+        OutboxBackend.drain()
+
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(Notification.objects.unread().count(), 0)
+        self.assertEqual(UserNotificationState.objects.get(user=self.author).unread_count, 0)
+
+        NotificationService.create_follow_notification(self.author, self.fans[2])
+        OutboxBackend.drain()
+        self.assertEqual(Notification.objects.unread().count(), 1)
+        self.assertEqual(UserNotificationState.objects.get(user=self.author).unread_count, 1)
@@ -1,12 +1,14 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import NotificationViewSet
+from .views import NotificationViewSet, notification_stream
 
 # Create router and register viewsets
 router = DefaultRouter()
 router.register(r'notifications', NotificationViewSet, basename='notification')
 
 urlpatterns = [
+    # Server-sent events; listed before the router so "stream" is not read as a pk
+    path('notifications/stream/', notification_stream, name='notification-stream'),
     # Include router URLs
     path('', include(router.urls)),
 ]
@@ -1,9 +1,19 @@
+from asgiref.sync import sync_to_async
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from django.core.handlers.asgi import ASGIRequest
 from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
 from .models import Notification
+from .streams import StreamTicket, event_stream
 from .serializers import NotificationSerializer, NotificationListSerializer, MarkAsReadSerializer
+from .services import NotificationService
+from social_media_api.pagination import KeysetPagination
 
 
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
@@ -12,10 +22,28 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     """
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = NotificationSerializer
+    pagination_class = KeysetPagination
+    query_budget = {
+        'list': 4,
+        'unread_count': 2,
+    }
 
     def get_queryset(self):
-        """Return notifications for the current user."""
-        return Notification.objects.filter(recipient=self.request.user)
+        """
+        Return notifications for the current user.
+
+        Actors are joined and targets are prefetched with one query per
+        content type, so a page costs the same number of queries at any size.
+        """
+        return Notification.objects.filter(
+            recipient=self.request.user
+        ).select_related('actor', 'target_content_type').prefetch_related('target')
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.user.is_authenticated:
+            context['read_up_to'] = NotificationService.get_read_up_to(self.request.user)
+        return context
 
     def list(self, request, *args, **kwargs):
         """List notifications with optional filtering."""
@@ -24,7 +52,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         # Filter by read status
         is_read = request.query_params.get('is_read')
         if is_read is not None:
-            queryset = queryset.filter(is_read=is_read.lower() == 'true')
+            queryset = queryset.read() if is_read.lower() == 'true' else queryset.unread()
         
         # Filter by notification type
         verb = request.query_params.get('verb')
@@ -32,7 +60,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(verb=verb)
         
         # Order by most recent first
-        queryset = queryset.order_by('-created_at')
+        queryset = queryset.order_by('-created_at', '-id')
         
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -45,9 +73,17 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get count of unread notifications."""
-        count = self.get_queryset().filter(is_read=False).count()
+        count = NotificationService.get_unread_count(request.user)
         return Response({'unread_count': count})
 
+    @action(detail=False, methods=['post'])
+    def stream_ticket(self, request):
+        """Issue a short-lived ticket for opening the notification stream."""
+        return Response({
+            'ticket': StreamTicket.issue(request.user),
+            'expires_in': StreamTicket.lifetime(),
+        })
+
     @action(detail=False, methods=['post'])
     def mark_as_read(self, request):
         """Mark specific notifications as read."""
@@ -55,7 +91,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         if serializer.is_valid():
             notification_ids = serializer.validated_data['notification_ids']
             notifications = self.get_queryset().filter(id__in=notification_ids)
-            updated_count = notifications.update(is_read=True)
+            updated_count = NotificationService.set_read_state(notifications)
             return Response({
                 'message': f'{updated_count} notifications marked as read',
                 'updated_count': updated_count
@@ -65,7 +101,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
         """Mark all notifications as read."""
-        updated_count = self.get_queryset().filter(is_read=False).update(is_read=True)
+        updated_count = NotificationService.mark_all_as_read(request.user)
         return Response({
             'message': f'{updated_count} notifications marked as read',
             'updated_count': updated_count
@@ -75,7 +111,54 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     def mark_single_as_read(self, request, pk=None):
         """Mark a single notification as read."""
         notification = self.get_object()
-        if not notification.is_read:
-            notification.mark_as_read()
+        if notification.mark_as_read():
             return Response({'message': 'Notification marked as read'})
-        return Response({'message': 'Notification was already read'})
\ No newline at end of file
+        return Response({'message': 'Notification was already read'})
+
+
+def _authenticate_stream(request):
+    """
+    Authenticate a stream request with the API's authentication classes,
+    falling back to a ``?ticket=`` from the stream_ticket endpoint because
+    EventSource cannot set request headers.
+    """
+    drf_request = Request(
+        request,
+        authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    )
+    try:
+        if drf_request.user.is_authenticated:
+            return drf_request.user
+    except AuthenticationFailed:
+        return None
+    ticket = request.GET.get('ticket')
+    if ticket:
+        return StreamTicket.verify(ticket)
+    return None
+
+
+@require_GET
+async def notification_stream(request):
+    """
+    Push new notifications to the current user as server-sent events.
+
+    Each connection is a coroutine rather than a worker, so this endpoint
+    must be served by an ASGI server (``social_media_api.asgi``).
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'detail': 'Notification streams require an ASGI server.'},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+
+    user = await sync_to_async(_authenticate_stream)(request)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    response = StreamingHttpResponse(event_stream(user.pk), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
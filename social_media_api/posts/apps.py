@@ -1,6 +1,16 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save, post_delete
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        from .models import Post, Comment
+        from .signals import invalidate_post_cache, sync_author_username
+        for model in (Post, Comment):
+            post_save.connect(invalidate_post_cache, sender=model)
+            post_delete.connect(invalidate_post_cache, sender=model)
+        # No sender filter: saves through the User proxy models count too
+        post_save.connect(sync_author_username, dispatch_uid='posts.sync_author_username')
@@ -0,0 +1,111 @@
+"""
+Versioned response cache for post detail bodies.
+
+Every post that has been read recently has a version number in the cache.
+Cached bodies are keyed by post ID and version, so bumping the version
+invalidates every cached variant of the post at once without having to know
+their keys. Version keys outlive the bodies cached under them
+(``POST_CACHE_VERSION_TIMEOUT`` > ``POST_CACHE_TIMEOUT``) but do expire, and
+are only created for posts the caller has found to exist.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from social_media_api.metrics import record_cache
+
+
+class PostResponseCache:
+    """
+    Cache of viewer-independent serialized post bodies.
+    """
+
+    @staticmethod
+    def _timeout():
+        return getattr(settings, 'POST_CACHE_TIMEOUT', 300)
+
+    @staticmethod
+    def _version_timeout():
+        return max(
+            getattr(settings, 'POST_CACHE_VERSION_TIMEOUT', 3600),
+            PostResponseCache._timeout() + 1
+        )
+
+    @staticmethod
+    def _version_key(post_id):
+        return f'posts:post:{post_id}:version'
+
+    @staticmethod
+    def _body_key(post_id, version, variant):
+        return f'posts:post:{post_id}:v{version}:{variant}'
+
+    @staticmethod
+    def _new_version():
+        # Start from the clock rather than 1 so a version key that was evicted
+        # never comes back with a number that old bodies are cached under.
+        return int(time.time() * 1000)
+
+    @staticmethod
+    def get_version(post_id):
+        """
+        Return the current version of a post, creating it if needed.
+        Only call this for a post that exists.
+        """
+        key = PostResponseCache._version_key(post_id)
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, PostResponseCache._new_version(), PostResponseCache._version_timeout())
+            version = cache.get(key)
+        return version
+
+    @staticmethod
+    def get_versions(post_ids):
+        """Return {post_id: version} for existing posts, creating missing versions."""
+        keys = {PostResponseCache._version_key(post_id): post_id for post_id in post_ids}
+        versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+        for post_id in post_ids:
+            if post_id not in versions:
+                versions[post_id] = PostResponseCache.get_version(post_id)
+        return versions
+
+    @staticmethod
+    def bump(post_id):
+        """Invalidate every cached body of a post once the transaction commits."""
+        def _bump():
+            try:
+                cache.incr(PostResponseCache._version_key(post_id))
+            except ValueError:
+                # No version means no reachable bodies; the next read starts a new one
+                pass
+        transaction.on_commit(_bump)
+
+    @staticmethod
+    def bump_for(instance):
+        """Bump the version of a post, or of the post a comment belongs to."""
+        post_id = instance.post_id if hasattr(instance, 'post_id') else instance.pk
+        PostResponseCache.bump(post_id)
+
+    @staticmethod
+    def get(post_id, variant):
+        """
+        Return a (version, body) tuple without creating anything. Body is None
+        on a cache miss, and version is None when the post has no version yet.
+        """
+        version = cache.get(PostResponseCache._version_key(post_id))
+        body = None
+        if version is not None:
+            body = cache.get(PostResponseCache._body_key(post_id, version, variant))
+        record_cache('post_response', body is not None)
+        return version, body
+
+    @staticmethod
+    def set(post_id, variant, version, body):
+        """Store a body under the version it was rendered for."""
+        cache.set(
+            PostResponseCache._body_key(post_id, version, variant),
+            body,
+            PostResponseCache._timeout()
+        )
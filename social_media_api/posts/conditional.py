@@ -0,0 +1,54 @@
+"""
+Conditional GET helpers for the posts API.
+
+ETags are derived from cheap fingerprints (an aggregate query over the
+filtered queryset, or cached post versions) so an unchanged resource can
+be answered with ``304 Not Modified`` before anything is serialized.
+"""
+
+import hashlib
+
+from django.db.models import Count, F, Max, Sum
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the given parts."""
+    digest = hashlib.md5(
+        ':'.join(str(part) for part in parts).encode('utf-8'),
+        usedforsecurity=False
+    ).hexdigest()
+    return quote_etag(digest)
+
+
+def queryset_fingerprint(queryset):
+    """
+    Summarize a post queryset with one aggregate query. Any edit, like,
+    comment, insert or delete changes at least one of the values. The
+    counters are also summed weighted by post ID, so changes to different
+    posts that cancel out in the plain totals still change the fingerprint.
+    """
+    return tuple(queryset.order_by().aggregate(
+        count=Count('id'),
+        last_updated=Max('updated_at'),
+        likes=Sum('likes_count'),
+        comments=Sum('comments_count'),
+        likes_by_post=Sum(F('id') * F('likes_count')),
+        comments_by_post=Sum(F('id') * F('comments_count')),
+    ).values())
+
+
+def not_modified(request, etag):
+    """Return a 304 response if the request's If-None-Match matches, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return with_etag(response, etag)
+    return None
+
+
+def with_etag(response, etag):
+    """Attach the ETag to a response; bodies differ per authenticated viewer."""
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Authorization'])
+    return response
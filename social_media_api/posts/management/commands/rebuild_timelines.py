@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from posts.services import TimelineService
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Backfill or repair the materialized home timelines.
+
+    Usage:
+        python manage.py rebuild_timelines
+        python manage.py rebuild_timelines --user alice --limit 500
+    """
+    help = 'Rebuild materialized home timelines from the follow graph.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            action='append',
+            dest='usernames',
+            help='Only rebuild the timeline of this user (can be repeated)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Maximum number of posts to keep per timeline'
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+            missing = set(options['usernames']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"Unknown users: {', '.join(sorted(missing))}")
+
+        rebuilt = 0
+        for user in users.iterator():
+            written = TimelineService.rebuild_timeline(user, limit=options['limit'])
+            rebuilt += 1
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{user.username}: {written} entries')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timelines'))
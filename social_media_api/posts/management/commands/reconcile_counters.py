@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from posts.services import CounterService
+
+
+class Command(BaseCommand):
+    """
+    Repair drift in the denormalized like and comment counters.
+
+    Usage:
+        python manage.py reconcile_counters
+        python manage.py reconcile_counters --batch-size 500
+    """
+    help = 'Recompute denormalized like and comment counters and fix drifted rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of rows checked per query'
+        )
+
+    def handle(self, *args, **options):
+        posts = CounterService.reconcile_posts(batch_size=options['batch_size'])
+        comments = CounterService.reconcile_comments(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Repaired {posts} posts and {comments} comments'
+        ))
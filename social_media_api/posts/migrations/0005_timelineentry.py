@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_like'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_created_at', models.DateTimeField(help_text="Copy of the post's creation time, used for ordering")),
+                ('post', models.ForeignKey(help_text='The post shown in the timeline', on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.post')),
+                ('user', models.ForeignKey(help_text='The user whose timeline contains the post', on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-post_created_at', '-post'],
+                'indexes': [models.Index(fields=['user', '-post_created_at', '-post'], name='posts_timel_user_id_31dd6b_idx')],
+                'unique_together': {('user', 'post')},
+            },
+        ),
+    ]
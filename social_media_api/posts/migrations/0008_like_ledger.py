@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def merge_m2m_likes(apps, schema_editor):
+    """
+    Copy likes that only exist in the old Post.likes join table into the
+    Like ledger, then recompute the stored likes_count from the ledger.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Like = apps.get_model('posts', 'Like')
+    PostLikes = Post.likes.through
+
+    rows = PostLikes.objects.values_list('post_id', 'user_id').order_by('pk')
+    batch = []
+    for post_id, user_id in rows.iterator(chunk_size=1000):
+        batch.append(Like(post_id=post_id, user_id=user_id))
+        if len(batch) >= 1000:
+            Like.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        Like.objects.bulk_create(batch, ignore_conflicts=True)
+
+    Post.objects.update(likes_count=Coalesce(Subquery(
+        Like.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Count('pk'))
+        .values('total')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_denormalized_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_m2m_likes, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='post',
+            name='likes',
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='likes',
+            field=models.ManyToManyField(blank=True, help_text='Users who liked this post', related_name='liked_posts', through='posts.Like', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,106 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:20
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+# The index only reads posts_post: the author's username is copied onto the
+# post, so rebuilding accounts_user never touches these triggers.
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+        title, content, author, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN
+        INSERT INTO posts_post_fts (rowid, title, content, author)
+        VALUES (new.id, new.title, new.content, new.author_username);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_update AFTER UPDATE OF title, content, author_username ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+        INSERT INTO posts_post_fts (rowid, title, content, author)
+        VALUES (new.id, new.title, new.content, new.author_username);
+    END
+    """,
+    """
+    CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN
+        DELETE FROM posts_post_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    INSERT INTO posts_post_fts (rowid, title, content, author)
+    SELECT id, title, content, author_username FROM posts_post
+    """,
+]
+
+SQLITE_BACKWARD = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TABLE IF EXISTS posts_post_fts',
+]
+
+POSTGRES_FORWARD = [
+    """
+    CREATE INDEX posts_post_search_idx ON posts_post USING GIN (
+        to_tsvector('english'::regconfig,
+                    coalesce(posts_post.title, '') || ' ' || coalesce(posts_post.content, '')
+                    || ' ' || coalesce(posts_post.author_username, ''))
+    )
+    """,
+]
+
+POSTGRES_BACKWARD = [
+    'DROP INDEX IF EXISTS posts_post_search_idx',
+]
+
+
+def copy_author_usernames(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post.objects.update(author_username=Subquery(
+        User.objects.filter(pk=OuterRef('author_id')).values('username')[:1]
+    ))
+
+
+def _run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FORWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_FORWARD)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_BACKWARD)
+    elif vendor == 'postgresql':
+        _run(schema_editor, POSTGRES_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_like_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='author_username',
+            field=models.CharField(blank=True, default='', editable=False, help_text="Copy of the author's username, kept for the search index", max_length=150),
+        ),
+        migrations.RunPython(copy_author_usernames, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
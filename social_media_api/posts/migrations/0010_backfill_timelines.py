@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:24
+
+from django.conf import settings
+from django.db import migrations
+
+
+def backfill_timelines(apps, schema_editor):
+    """
+    Fill the timelines of every user who follows someone, so feeds are not
+    empty between deploying the timeline table and a rebuild_timelines run.
+    """
+    Follow = apps.get_model('accounts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    limit = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+
+    follower_ids = list(
+        Follow.objects.order_by('follower_id').values_list('follower_id', flat=True).distinct()
+    )
+    for follower_id in follower_ids:
+        posts = Post.objects.filter(
+            author__in=Follow.objects.filter(follower_id=follower_id).values('followed_id')
+        ).order_by('-created_at', '-id')
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=follower_id, post_id=post_id, post_created_at=created_at)
+                for post_id, created_at in posts.values_list('id', 'created_at')[:limit]
+            ],
+            batch_size=1000,
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_post_search_index'),
+        ('accounts', '0003_follow_edges'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -16,6 +16,13 @@ class Post(models.Model):
         related_name='posts',
         help_text="The user who created this post"
     )
+    author_username = models.CharField(
+        max_length=150,
+        blank=True,
+        default='',
+        editable=False,
+        help_text="Copy of the author's username, kept for the search index"
+    )
     title = models.CharField(
         max_length=200, 
         help_text="The title of the post"
@@ -41,28 +48,41 @@ class Post(models.Model):
     )
     likes = models.ManyToManyField(
         User,
+        through='Like',
         related_name='liked_posts',
         blank=True,
         help_text="Users who liked this post"
     )
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of likes, kept in sync by the like and unlike code paths"
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of comments, kept in sync by the comment code paths"
+    )
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Post'
         verbose_name_plural = 'Posts'
+        indexes = [
+            models.Index(fields=['author', '-created_at', '-id']),
+            models.Index(fields=['-likes_count', '-created_at']),
+            models.Index(fields=['-comments_count', '-created_at']),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.author.username}"
 
-    @property
-    def likes_count(self):
-        """Return the number of likes."""
-        return self.likes.count()
-
-    @property
-    def comments_count(self):
-        """Return the number of comments."""
-        return self.comments.count()
+    def save(self, *args, **kwargs):
+        # Keep the search index's copy of the author's username current
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'author' in update_fields:
+            self.author_username = self.author.username
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'author_username'}
+        super().save(*args, **kwargs)
 
     def get_absolute_url(self):
         return reverse('post-detail', kwargs={'pk': self.pk})
@@ -109,20 +129,24 @@ class Comment(models.Model):
         blank=True,
         help_text="Users who liked this comment"
     )
+    likes_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of likes, kept in sync by the like code path"
+    )
 
     class Meta:
         ordering = ['created_at']
         verbose_name = 'Comment'
         verbose_name_plural = 'Comments'
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['post', 'created_at', 'id']),
+            models.Index(fields=['author', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
 
-    @property
-    def likes_count(self):
-        """Return the number of likes."""
-        return self.likes.count()
-
     def get_absolute_url(self):
         return reverse('comment-detail', kwargs={'pk': self.pk})
 
@@ -130,6 +154,7 @@ class Comment(models.Model):
 class Like(models.Model):
     """
     Like model for tracking post likes.
+    This is the single like ledger; Post.likes reads through it.
     """
     user = models.ForeignKey(
         User,
@@ -154,4 +179,37 @@ class Like(models.Model):
 
     def clean(self):
         if self.user == self.post.author:
-            raise ValidationError("Users cannot like their own posts.")
\ No newline at end of file
+            raise ValidationError("Users cannot like their own posts.")
+
+
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline entry.
+    One row per (follower, post), written when the post is created so the
+    feed can be read as a pre-sorted list of post IDs.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        help_text="The user whose timeline contains the post"
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        help_text="The post shown in the timeline"
+    )
+    post_created_at = models.DateTimeField(
+        help_text="Copy of the post's creation time, used for ordering"
+    )
+
+    class Meta:
+        unique_together = ('user', 'post')
+        ordering = ['-post_created_at', '-post']
+        indexes = [
+            models.Index(fields=['user', '-post_created_at', '-post']),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in timeline of user {self.user_id}"
@@ -0,0 +1,39 @@
+from django.core.paginator import Paginator
+from rest_framework.pagination import PageNumberPagination
+from social_media_api.pagination import KeysetPagination
+
+
+class PostPagination(PageNumberPagination):
+    """
+    Page-number pagination that reuses a row count the view has already
+    computed (``view.known_count``) instead of running its own COUNT query.
+    """
+    known_count = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.known_count = getattr(view, 'known_count', None)
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, object_list, per_page):
+        paginator = Paginator(object_list, per_page)
+        if self.known_count is not None:
+            paginator.count = self.known_count
+        return paginator
+
+
+class TimelineCursorPagination(KeysetPagination):
+    """
+    Cursor pagination over materialized timeline entries.
+    Always in timeline order: the view's ``?ordering=`` names post fields.
+    """
+    ordering = ('-post_created_at', '-post_id')
+
+    def get_ordering(self, request, queryset, view):
+        return type(self).ordering
+
+
+class CommentCursorPagination(KeysetPagination):
+    """
+    Cursor pagination for comments, oldest first.
+    """
+    ordering = ('created_at', 'id')
@@ -0,0 +1,124 @@
+"""
+Full-text search for posts.
+
+The search backend is chosen from ``settings.POST_SEARCH_BACKEND`` (a dotted
+path) or, when unset, from the database vendor: an FTS5 virtual table on
+SQLite and a GIN expression index on PostgreSQL. Both index the title,
+content and the post's copy of its author's username, match every term as a
+prefix, and are kept up to date by the database itself (see the ``0009``
+migration).
+"""
+
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+
+class SimpleSearchBackend:
+    """
+    Fallback backend that uses DRF's ``icontains`` search over ``search_fields``.
+    """
+    ranked = False
+
+    def search(self, queryset, terms, request, view):
+        return filters.SearchFilter().filter_queryset(request, queryset, view)
+
+
+class SQLiteFTS5Backend:
+    """
+    Search backend using the ``posts_post_fts`` FTS5 table, ranked by bm25.
+    """
+    ranked = True
+    table = 'posts_post_fts'
+
+    @staticmethod
+    def build_query(terms):
+        """Turn search terms into an FTS5 prefix query: "term1"* "term2"*."""
+        return ' '.join('"{}"*'.format(term.replace('"', '')) for term in terms)
+
+    def search(self, queryset, terms, request, view):
+        query = self.build_query(terms)
+        table = self.table
+        matches = RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [query])
+        rank = RawSQL(
+            f'SELECT -bm25({table}) FROM {table} '
+            f'WHERE {table} MATCH %s AND {table}.rowid = posts_post.id',
+            [query]
+        )
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+class PostgresFullTextBackend:
+    """
+    Search backend using the GIN index on the post's tsvector, ranked by ts_rank.
+    """
+    ranked = True
+    config = 'english'
+    document = (
+        "to_tsvector('english'::regconfig, "
+        "coalesce(posts_post.title, '') || ' ' || coalesce(posts_post.content, '') "
+        "|| ' ' || coalesce(posts_post.author_username, ''))"
+    )
+
+    @staticmethod
+    def build_query(terms):
+        """Turn search terms into a tsquery with prefix matching: term1:* & term2:*."""
+        words = [re.sub(r'[^\w]', '', term) for term in terms]
+        return ' & '.join(f'{word}:*' for word in words if word)
+
+    def search(self, queryset, terms, request, view):
+        query = self.build_query(terms)
+        if not query:
+            return queryset.none()
+        tsquery = f"to_tsquery('{self.config}'::regconfig, %s)"
+        matches = RawSQL(f'SELECT id FROM posts_post WHERE {self.document} @@ {tsquery}', [query])
+        rank = RawSQL(f'ts_rank({self.document}, {tsquery})', [query])
+        return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+_fts5_table_exists = None
+
+
+def get_search_backend():
+    """Return the configured search backend instance."""
+    global _fts5_table_exists
+
+    backend_path = getattr(settings, 'POST_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+
+    if connection.vendor == 'postgresql':
+        return PostgresFullTextBackend()
+    if connection.vendor == 'sqlite':
+        if _fts5_table_exists is None:
+            _fts5_table_exists = SQLiteFTS5Backend.table in connection.introspection.table_names()
+        if _fts5_table_exists:
+            return SQLiteFTS5Backend()
+    return SimpleSearchBackend()
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    Search filter for ``?search=`` that queries the full-text index.
+
+    Results are ordered by relevance unless the client passes ``?ordering=``.
+    Place it after ``OrderingFilter`` in ``filter_backends`` so the relevance
+    ordering is not overwritten by the default ordering.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        backend = get_search_backend()
+        queryset = backend.search(queryset, terms, request, view)
+
+        ordering_param = filters.OrderingFilter.ordering_param
+        if backend.ranked and not request.query_params.get(ordering_param):
+            queryset = queryset.order_by('-search_rank', '-created_at')
+        return queryset
@@ -1,10 +1,53 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import models
 from .models import Post, Comment, Like
 
 User = get_user_model()
 
 
+class LikedByViewerListSerializer(serializers.ListSerializer):
+    """
+    List serializer that resolves which items the viewer has liked with a
+    single query before the items are serialized.
+    """
+
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        self.child.prime_liked_ids(items)
+        return super().to_representation(items)
+
+
+class LikedByViewerMixin:
+    """
+    Provides ``get_is_liked`` for serializers of models with a ``likes``
+    many-to-many field to users.
+    """
+    _liked_ids = None
+
+    def prime_liked_ids(self, objects):
+        """Load the IDs of the given objects that the viewer has liked."""
+        request = self.context.get('request')
+        if not (request and request.user.is_authenticated) or not objects:
+            self._liked_ids = set()
+            return
+        likes_field = self.Meta.model._meta.get_field('likes')
+        object_field = likes_field.m2m_field_name()
+        user_field = likes_field.m2m_reverse_field_name()
+        self._liked_ids = set(
+            likes_field.remote_field.through.objects.filter(**{
+                user_field: request.user.pk,
+                f'{object_field}__in': [obj.pk for obj in objects],
+            }).values_list(f'{object_field}_id', flat=True)
+        )
+
+    def get_is_liked(self, obj):
+        """Check if the current user has liked this object."""
+        if self._liked_ids is None:
+            self.prime_liked_ids([obj])
+        return obj.pk in self._liked_ids
+
+
 class PostListSerializer(serializers.ModelSerializer):
     """
     Serializer for listing posts (minimal data).
@@ -21,7 +64,7 @@ class PostListSerializer(serializers.ModelSerializer):
         )
 
 
-class PostDetailSerializer(serializers.ModelSerializer):
+class PostDetailSerializer(LikedByViewerMixin, serializers.ModelSerializer):
     """
     Serializer for detailed post view.
     """
@@ -37,13 +80,7 @@ class PostDetailSerializer(serializers.ModelSerializer):
             'likes_count', 'comments_count', 'is_liked'
         )
         read_only_fields = ('id', 'created_at', 'updated_at')
-
-    def get_is_liked(self, obj):
-        """Check if the current user has liked this post."""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.id).exists()
-        return False
+        list_serializer_class = LikedByViewerListSerializer
 
 
 class PostCreateUpdateSerializer(serializers.ModelSerializer):
@@ -61,7 +98,7 @@ class PostCreateUpdateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(LikedByViewerMixin, serializers.ModelSerializer):
     """
     Serializer for comments.
     """
@@ -76,13 +113,7 @@ class CommentSerializer(serializers.ModelSerializer):
             'likes_count', 'is_liked'
         )
         read_only_fields = ('id', 'created_at', 'updated_at')
-
-    def get_is_liked(self, obj):
-        """Check if the current user has liked this comment."""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.id).exists()
-        return False
+        list_serializer_class = LikedByViewerListSerializer
 
     def create(self, validated_data):
         """Create a new comment with the current user as author."""
@@ -104,7 +135,7 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PostWithCommentsSerializer(serializers.ModelSerializer):
+class PostWithCommentsSerializer(LikedByViewerMixin, serializers.ModelSerializer):
     """
     Serializer for posts with their comments.
     """
@@ -120,13 +151,7 @@ class PostWithCommentsSerializer(serializers.ModelSerializer):
             'id', 'title', 'content', 'author', 'created_at', 'updated_at',
             'likes_count', 'comments_count', 'is_liked', 'comments'
         )
-
-    def get_is_liked(self, obj):
-        """Check if the current user has liked this post."""
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(id=request.user.id).exists()
-        return False
+        list_serializer_class = LikedByViewerListSerializer
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -0,0 +1,298 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.contrib.auth import get_user_model
+from accounts.models import Follow
+from .models import Post, Comment, Like, TimelineEntry
+from .cache import PostResponseCache
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+
+class TimelineService:
+    """
+    Service class for maintaining the materialized home timelines.
+    """
+
+    @staticmethod
+    def _batch_size():
+        return getattr(settings, 'TIMELINE_FANOUT_BATCH_SIZE', 1000)
+
+    @staticmethod
+    def _backfill_limit():
+        return getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+
+    @staticmethod
+    def _write_entries(entries):
+        """Insert timeline entries in batches, skipping ones that already exist."""
+        TimelineEntry.objects.bulk_create(
+            entries,
+            batch_size=TimelineService._batch_size(),
+            ignore_conflicts=True
+        )
+
+    @staticmethod
+    def fan_out_post(post):
+        """
+        Push a newly created post into the timeline of every follower
+        of its author.
+        """
+        follower_ids = Follow.objects.filter(
+            followed_id=post.author_id
+        ).values_list('follower_id', flat=True)
+
+        batch = []
+        for follower_id in follower_ids.iterator(chunk_size=TimelineService._batch_size()):
+            batch.append(TimelineEntry(
+                user_id=follower_id,
+                post_id=post.pk,
+                post_created_at=post.created_at
+            ))
+            if len(batch) >= TimelineService._batch_size():
+                TimelineService._write_entries(batch)
+                batch = []
+        if batch:
+            TimelineService._write_entries(batch)
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def schedule_fan_out(post):
+        """
+        Fan a new post out off the request path.
+
+        With ``TIMELINE_FANOUT_BACKEND = 'inprocess'`` the post is handed to a
+        background thread once the transaction commits. Fan-outs still queued
+        when the process dies are lost; ``rebuild_timelines`` repairs them.
+        Any other value fans out before returning.
+        """
+        if getattr(settings, 'TIMELINE_FANOUT_BACKEND', 'immediate') != 'inprocess':
+            TimelineService.fan_out_post(post)
+            return
+        transaction.on_commit(
+            lambda: TimelineService._get_executor().submit(TimelineService._run_fan_out, post)
+        )
+
+    @staticmethod
+    def _get_executor():
+        # Created lazily so a preloaded app forks before the thread exists
+        with TimelineService._executor_lock:
+            if TimelineService._executor is None:
+                TimelineService._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='timeline-fanout'
+                )
+        return TimelineService._executor
+
+    @staticmethod
+    def _run_fan_out(post):
+        close_old_connections()
+        try:
+            TimelineService.fan_out_post(post)
+        except Exception:
+            logger.exception('Failed to fan out post %s', post.pk)
+        finally:
+            close_old_connections()
+
+    @staticmethod
+    def add_author(user, author, limit=None):
+        """Backfill the recent posts of a newly followed author into a timeline."""
+        limit = limit or TimelineService._backfill_limit()
+        posts = Post.objects.filter(author=author).order_by('-created_at', '-id')
+        TimelineService._write_entries([
+            TimelineEntry(user_id=user.pk, post_id=post_id, post_created_at=created_at)
+            for post_id, created_at in posts.values_list('id', 'created_at')[:limit]
+        ])
+
+    @staticmethod
+    def remove_author(user, author):
+        """Remove every post of an unfollowed author from a timeline."""
+        TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+    @staticmethod
+    def rebuild_timeline(user, limit=None):
+        """
+        Rebuild a user's timeline from the follow graph.
+
+        Returns the number of entries written.
+        """
+        limit = limit or TimelineService._backfill_limit()
+        posts = Post.objects.filter(
+            author__in=Follow.objects.filter(
+                follower_id=user.pk
+            ).values('followed_id')
+        ).order_by('-created_at', '-id')
+        entries = [
+            TimelineEntry(user_id=user.pk, post_id=post_id, post_created_at=created_at)
+            for post_id, created_at in posts.values_list('id', 'created_at')[:limit]
+        ]
+        with transaction.atomic():
+            TimelineEntry.objects.filter(user=user).delete()
+            TimelineService._write_entries(entries)
+        return len(entries)
+
+
+class CounterService:
+    """
+    Service class for the denormalized like and comment counters.
+    """
+
+    @staticmethod
+    def _adjust(model, pk, field, delta):
+        if delta:
+            # Clamp at zero so a drifted counter never violates the unsigned column
+            model.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+    @staticmethod
+    def adjust_post_likes(post_id, delta):
+        """Add delta to a post's likes_count."""
+        CounterService._adjust(Post, post_id, 'likes_count', delta)
+        PostResponseCache.bump(post_id)
+
+    @staticmethod
+    def adjust_post_comments(post_id, delta):
+        """Add delta to a post's comments_count."""
+        CounterService._adjust(Post, post_id, 'comments_count', delta)
+        PostResponseCache.bump(post_id)
+
+    @staticmethod
+    def adjust_comment_likes(comment_id, delta):
+        """Add delta to a comment's likes_count."""
+        CounterService._adjust(Comment, comment_id, 'likes_count', delta)
+        post_id = Comment.objects.filter(pk=comment_id).values_list('post_id', flat=True).first()
+        if post_id is not None:
+            PostResponseCache.bump(post_id)
+
+    @staticmethod
+    def _actual_count(model, field):
+        return Coalesce(Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ), 0)
+
+    @staticmethod
+    def _reconcile(queryset, counters, batch_size):
+        """
+        Recompute counters in primary key ranges and rewrite the rows
+        that drifted. Returns the number of repaired rows.
+        """
+        repaired = 0
+        last_pk = 0
+        while True:
+            batch = list(
+                queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+            )
+            if not batch:
+                return repaired
+            last_pk = batch[-1]
+
+            rows = queryset.filter(pk__in=batch).annotate(**{
+                f'actual_{field}': expression for field, expression in counters.items()
+            })
+            for row in rows.values('pk', *counters, *[f'actual_{field}' for field in counters]):
+                changes = {
+                    field: row[f'actual_{field}']
+                    for field in counters
+                    if row[field] != row[f'actual_{field}']
+                }
+                if changes:
+                    queryset.filter(pk=row['pk']).update(**changes)
+                    repaired += 1
+
+    @staticmethod
+    def reconcile_posts(batch_size=1000):
+        """Repair drifted likes_count and comments_count values on posts."""
+        return CounterService._reconcile(Post.objects.all(), {
+            'likes_count': CounterService._actual_count(Like, 'post'),
+            'comments_count': CounterService._actual_count(Comment, 'post'),
+        }, batch_size)
+
+    @staticmethod
+    def reconcile_comments(batch_size=1000):
+        """Repair drifted likes_count values on comments."""
+        return CounterService._reconcile(Comment.objects.all(), {
+            'likes_count': CounterService._actual_count(Comment.likes.through, 'comment'),
+        }, batch_size)
+
+
+class LikeService:
+    """
+    Service class for atomic like and unlike operations.
+
+    Works on any model with a ``likes`` many-to-many field to users and a
+    stored ``likes_count``. A like is recorded by a single conditional INSERT
+    or DELETE, so concurrent taps neither double-count nor need row locks on
+    the ledger. The counter is moved afterwards by its own short UPDATE, so
+    likes on a hot post only hold its row lock for that one statement rather
+    than for the whole ledger write. A crash between the two leaves the
+    counter drifted by one, which ``reconcile_counters`` repairs.
+    """
+
+    @staticmethod
+    def _ledger(obj):
+        likes_field = obj._meta.get_field('likes')
+        return (
+            likes_field.remote_field.through,
+            likes_field.m2m_field_name(),
+            likes_field.m2m_reverse_field_name(),
+        )
+
+    @staticmethod
+    def _likes_count(obj):
+        return type(obj).objects.filter(pk=obj.pk).values_list('likes_count', flat=True).first() or 0
+
+    @staticmethod
+    def like(obj, user):
+        """
+        Like an object.
+
+        Returns a (created, likes_count) tuple; created is False if the user
+        had already liked it.
+        """
+        through, object_field, user_field = LikeService._ledger(obj)
+        try:
+            with transaction.atomic():
+                through.objects.create(**{object_field: obj, user_field: user})
+        except IntegrityError:
+            return False, LikeService._likes_count(obj)
+        CounterService._adjust(type(obj), obj.pk, 'likes_count', 1)
+        PostResponseCache.bump_for(obj)
+        return True, LikeService._likes_count(obj)
+
+    @staticmethod
+    def unlike(obj, user):
+        """
+        Remove a like.
+
+        Returns a (deleted, likes_count) tuple; deleted is False if the user
+        had not liked it.
+        """
+        through, object_field, user_field = LikeService._ledger(obj)
+        deleted, _ = through.objects.filter(**{object_field: obj, user_field: user}).delete()
+        if deleted:
+            CounterService._adjust(type(obj), obj.pk, 'likes_count', -deleted)
+            PostResponseCache.bump_for(obj)
+        return bool(deleted), LikeService._likes_count(obj)
+
+    @staticmethod
+    def toggle(obj, user):
+        """
+        Like an object, or unlike it if it was already liked.
+
+        Returns a (liked, likes_count) tuple describing the new state.
+        """
+        created, likes_count = LikeService.like(obj, user)
+        if created:
+            return True, likes_count
+        _, likes_count = LikeService.unlike(obj, user)
+        return False, likes_count
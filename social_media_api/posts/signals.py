@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from .cache import PostResponseCache
+from .models import Post
+
+
+def invalidate_post_cache(sender, instance, **kwargs):
+    """Bump the cached version of a post when it or one of its comments changes."""
+    PostResponseCache.bump_for(instance)
+
+
+def sync_author_username(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Carry a username change over to the author's posts and their search
+    index, and invalidate their cached bodies and ETags.
+    """
+    if created or not isinstance(instance, get_user_model()):
+        return
+    if update_fields is not None and 'username' not in update_fields:
+        return
+    if 'username' in instance.get_deferred_fields():
+        return
+    posts = Post.objects.filter(author_id=instance.pk).exclude(author_username=instance.username)
+    post_ids = list(posts.values_list('id', flat=True))
+    posts.update(author_username=instance.username, updated_at=timezone.now())
+    for post_id in post_ids:
+        PostResponseCache.bump(post_id)
@@ -1,10 +1,21 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from io import StringIO
+from unittest import mock
 from rest_framework.test import APITestCase
+from social_media_api.testing import QueryBudgetMixin
 from rest_framework import status
 from django.urls import reverse
 from rest_framework.authtoken.models import Token
-from .models import Post, Comment
+from accounts.authentication import CachedTokenAuthentication
+from .cache import PostResponseCache
+from .search import PostgresFullTextBackend
+from .models import Post, Comment, Like, TimelineEntry
+from .services import CounterService, LikeService, TimelineService
 
 User = get_user_model()
 
@@ -35,8 +46,51 @@ class PostModelTest(TestCase):
             email='test2@example.com',
             password='testpass123'
         )
-        self.post.likes.add(user2)
+        self.assertEqual(LikeService.like(self.post, user2), (True, 1))
+        self.assertEqual(LikeService.like(self.post, user2), (False, 1))
+        self.assertIn(user2, self.post.likes.all())
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+
+        self.assertEqual(LikeService.unlike(self.post, user2), (True, 0))
+        self.assertEqual(LikeService.unlike(self.post, user2), (False, 0))
+        self.assertFalse(self.post.likes.exists())
+
+    def test_like_counter_is_not_updated_inside_the_ledger_write(self):
+        user2 = User.objects.create_user(
+            username='testuser2',
+            email='test2@example.com',
+            password='testpass123'
+        )
+        depth = len(connection.savepoint_ids)
+        atomic_depths = []
+        adjust = CounterService._adjust
+
+        def record_depth(*args):
+            atomic_depths.append(len(connection.savepoint_ids) - depth)
+            adjust(*args)
+
+        with mock.patch.object(CounterService, '_adjust', side_effect=record_depth):
+            LikeService.like(self.post, user2)
+            LikeService.unlike(self.post, user2)
+        self.assertEqual(atomic_depths, [0, 0])
+
+    def test_reconcile_counters_repairs_drift(self):
+        user2 = User.objects.create_user(
+            username='testuser2',
+            email='test2@example.com',
+            password='testpass123'
+        )
+        Like.objects.create(user=user2, post=self.post)
+        comment = Comment.objects.create(post=self.post, author=user2, content='Hi')
+        comment.likes.add(self.user)
+
+        call_command('reconcile_counters', stdout=StringIO())
+
+        self.post.refresh_from_db()
+        comment.refresh_from_db()
         self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(comment.likes_count, 1)
 
     def test_post_str(self):
         expected = f"{self.post.title} by {self.post.author.username}"
@@ -72,8 +126,9 @@ class CommentModelTest(TestCase):
         self.assertEqual(str(self.comment), expected)
 
 
-class PostAPITest(APITestCase):
+class PostAPITest(QueryBudgetMixin, APITestCase):
     def setUp(self):
+        cache.clear()
         self.user = User.objects.create_user(
             username='testuser',
             email='test@example.com',
@@ -93,6 +148,17 @@ class PostAPITest(APITestCase):
         self.assertEqual(Post.objects.count(), 1)
         self.assertEqual(Post.objects.get().title, 'New Post')
 
+    def test_list_and_liked_posts_stay_within_query_budget(self):
+        CachedTokenAuthentication.reset()
+        for i in range(5):
+            post = Post.objects.create(author=self.user, title=f'Post {i}', content='Content')
+            LikeService.like(post, self.user)
+        # QueryBudgetMixin fails the request if it runs over the view's budget
+        response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.data['count'], 5)
+        response = self.client.get(reverse('post-liked-posts'))
+        self.assertEqual(len(response.data['results']), 5)
+
     def test_list_posts(self):
         Post.objects.create(
             author=self.user,
@@ -154,7 +220,26 @@ class PostAPITest(APITestCase):
         url = reverse('post-like', kwargs={'pk': post.pk})
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        post.refresh_from_db()
         self.assertEqual(post.likes_count, 1)
+        self.assertEqual(response.data['likes_count'], 1)
+
+        detail = self.client.get(reverse('post-detail', kwargs={'pk': post.pk}))
+        self.assertTrue(detail.data['is_liked'])
+
+        response = self.client.post(url)
+        self.assertEqual(response.data['message'], 'Post unliked')
+        self.assertEqual(response.data['likes_count'], 0)
+
+    def test_order_by_likes_count(self):
+        quiet = Post.objects.create(author=self.user, title='Quiet', content='Content')
+        popular = Post.objects.create(author=self.user, title='Popular', content='Content')
+        CounterService.adjust_post_likes(popular.pk, 3)
+        response = self.client.get(reverse('post-list') + '?ordering=-likes_count')
+        self.assertEqual(
+            [post['id'] for post in response.data['results']],
+            [popular.pk, quiet.pk]
+        )
 
     def test_my_posts(self):
         Post.objects.create(
@@ -168,7 +253,7 @@ class PostAPITest(APITestCase):
         self.assertEqual(len(response.data['results']), 1)
 
 
-class CommentAPITest(APITestCase):
+class CommentAPITest(QueryBudgetMixin, APITestCase):
     def setUp(self):
         self.user = User.objects.create_user(
             username='testuser',
@@ -192,6 +277,8 @@ class CommentAPITest(APITestCase):
         response = self.client.post(url, data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(Comment.objects.count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
 
     def test_list_comments(self):
         Comment.objects.create(
@@ -254,10 +341,429 @@ class CommentAPITest(APITestCase):
         url = reverse('comment-like', kwargs={'pk': comment.pk})
         response = self.client.post(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        comment.refresh_from_db()
         self.assertEqual(comment.likes_count, 1)
 
+    def test_list_comments_honours_requested_ordering(self):
+        comments = [
+            Comment.objects.create(post=self.post, author=self.user, content=f'Comment {i}')
+            for i in range(3)
+        ]
+        Comment.objects.filter(pk=comments[1].pk).update(likes_count=5)
+        Comment.objects.filter(pk=comments[2].pk).update(likes_count=5)
+
+        url = reverse('comment-list')
+        response = self.client.get(url, {'ordering': '-likes_count', 'page_size': 2})
+        self.assertEqual(
+            [item['id'] for item in response.data['results']], [comments[2].id, comments[1].id]
+        )
+        response = self.client.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']], [comments[0].id])
+
+        response = self.client.get(url, {'ordering': '-likes_count,created_at'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FeedTimelineTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='testpass123'
+        )
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.author_token = Token.objects.create(user=self.author)
+
+    def follow_author(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.client.post(reverse('follow_user', kwargs={'user_id': self.author.pk}))
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        self.follow_author()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.author_token.key)
+        self.client.post(reverse('post-list'), {'title': 'Fresh', 'content': 'Fresh content'})
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        response = self.client.get(reverse('post-feed'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post['title'] for post in response.data['results']], ['Fresh'])
+
+    def test_feed_ignores_post_ordering_parameters(self):
+        self.follow_author()
+        first = Post.objects.create(author=self.author, title='First', content='First content')
+        second = Post.objects.create(author=self.author, title='Second', content='Second content')
+        TimelineService.fan_out_post(first)
+        TimelineService.fan_out_post(second)
+        Like.objects.create(user=self.user, post=first)
+        Post.objects.filter(pk=first.pk).update(likes_count=1)
+
+        for ordering in ('created_at', '-likes_count'):
+            response = self.client.get(reverse('post-feed'), {'ordering': ordering})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([post['title'] for post in response.data['results']], ['Second', 'First'])
+
+    @override_settings(TIMELINE_FANOUT_BACKEND='inprocess')
+    def test_fan_out_runs_off_the_request_path(self):
+        self.follow_author()
+        submitted = []
+
+        class Executor:
+            def submit(self, fn, *args):
+                submitted.append((fn, args))
+
+        TimelineService._executor = Executor()
+        try:
+            self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.author_token.key)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    reverse('post-list'), {'title': 'Fresh', 'content': 'Fresh content'}
+                )
+        finally:
+            TimelineService._executor = None
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+        fn, args = submitted[0]
+        fn(*args)
+        self.assertEqual(
+            list(TimelineEntry.objects.filter(user=self.user).values_list('post_id', flat=True)),
+            [response.data['id']]
+        )
+
+    def test_follow_backfills_and_unfollow_removes_posts(self):
+        Post.objects.create(author=self.author, title='Old', content='Old content')
+        self.follow_author()
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 1)
+
+        self.client.post(reverse('unfollow_user', kwargs={'user_id': self.author.pk}))
+        response = self.client.get(reverse('post-feed'))
+        self.assertEqual(response.data['results'], [])
+
+    def test_rebuild_timelines_command(self):
+        self.user.following.add(self.author)
+        first = Post.objects.create(author=self.author, title='First', content='First content')
+        second = Post.objects.create(author=self.author, title='Second', content='Second content')
+
+        call_command('rebuild_timelines', stdout=StringIO())
+
+        post_ids = list(
+            TimelineEntry.objects.filter(user=self.user).values_list('post_id', flat=True)
+        )
+        self.assertEqual(post_ids, [second.pk, first.pk])
+
+
+class CursorPaginationTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.posts = [
+            Post.objects.create(author=self.user, title=f'Post {i}', content='Content')
+            for i in range(5)
+        ]
+
+    def test_walks_pages_with_cursor(self):
+        url = reverse('post-my-posts') + '?page_size=2'
+        titles = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            titles.extend(post['title'] for post in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(titles, [f'Post {i}' for i in reversed(range(5))])
+
+    def test_previous_link_returns_to_earlier_page(self):
+        first = self.client.get(reverse('post-my-posts') + '?page_size=2')
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_count_is_optional(self):
+        response = self.client.get(reverse('post-my-posts') + '?with_count=true')
+        self.assertEqual(response.data['count'], 5)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('post-my-posts') + '?cursor=garbage')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class IsLikedBatchTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = Post.objects.create(author=self.user, title='Post', content='Content')
+
+    def add_comments(self, count):
+        comments = [
+            Comment.objects.create(post=self.post, author=self.user, content=f'Comment {i}')
+            for i in range(count)
+        ]
+        comments[0].likes.add(self.user)
+        return comments
+
+    def count_queries(self, url):
+        cache.clear()
+        CachedTokenAuthentication.reset()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(context.captured_queries), response
+
+    def test_comment_list_flags_liked_comments(self):
+        comments = self.add_comments(3)
+        _, response = self.count_queries(reverse('comment-list'))
+        flags = {comment['id']: comment['is_liked'] for comment in response.data['results']}
+        self.assertEqual(flags, {comments[0].pk: True, comments[1].pk: False, comments[2].pk: False})
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        self.add_comments(2)
+        small, _ = self.count_queries(reverse('comment-list'))
+        self.add_comments(8)
+        large, _ = self.count_queries(reverse('comment-list'))
+        self.assertEqual(small, large)
+
+    def test_nested_comments_are_resolved_in_one_query(self):
+        self.add_comments(2)
+        url = reverse('post-retrieve-with-comments', kwargs={'pk': self.post.pk})
+        small, _ = self.count_queries(url)
+        self.add_comments(8)
+        large, response = self.count_queries(url)
+        self.assertEqual(small, large)
+        self.assertEqual(len(response.data['comments']), 10)
+
+
+class PostResponseCacheTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader',
+            email='reader@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = Post.objects.create(author=self.user, title='Cached', content='Content')
+        self.url = reverse('post-retrieve-with-comments', kwargs={'pk': self.post.pk})
+
+    def test_hot_read_skips_serialization_queries(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['title'], 'Cached')
+        # Token lookup plus the two per-viewer is_liked lookups
+        self.assertLessEqual(len(context.captured_queries), 3)
+
+    def test_comment_and_like_bump_the_version(self):
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('comment-list'), {'post': self.post.pk, 'content': 'New'})
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['comments_count'], 1)
+        self.assertEqual(len(response.data['comments']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['likes_count'], 1)
+        self.assertTrue(response.data['is_liked'])
+
+    def test_is_liked_is_per_viewer(self):
+        other = User.objects.create_user(
+            username='other',
+            email='other@example.com',
+            password='testpass123'
+        )
+        LikeService.like(self.post, other)
+        self.client.get(self.url)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + Token.objects.create(user=other).key)
+        self.assertTrue(self.client.get(self.url).data['is_liked'])
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.assertFalse(self.client.get(self.url).data['is_liked'])
+
+    def test_missing_post_creates_no_version_key(self):
+        missing = self.post.pk + 1000
+        response = self.client.get(reverse('post-detail', kwargs={'pk': missing}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(cache.get(PostResponseCache._version_key(missing)))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            PostResponseCache.bump(missing)
+        self.assertIsNone(cache.get(PostResponseCache._version_key(missing)))
+
+
+class ConditionalGetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='poller',
+            email='poller@example.com',
+            password='testpass123'
+        )
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='testpass123'
+        )
+        self.user.following.add(self.author)
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        TimelineService.fan_out_post(self.post)
+
+    def assertRevalidates(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        etag = first['ETag']
+
+        unchanged = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(unchanged.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(unchanged['ETag'], etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def like_post(self):
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+
+    def test_list(self):
+        self.assertRevalidates(reverse('post-list'), self.like_post)
+
+    def test_list_revalidates_on_offsetting_likes(self):
+        other = Post.objects.create(author=self.author, title='Other', content='Content')
+        LikeService.like(other, self.user)
+
+        def like_one_unlike_other():
+            self.like_post()
+            self.client.post(reverse('post-unlike', kwargs={'pk': other.pk}))
+        self.assertRevalidates(reverse('post-list'), like_one_unlike_other)
+
+    def test_list_revalidates_on_offsetting_comments(self):
+        other = Post.objects.create(author=self.author, title='Other', content='Content')
+        comment = Comment.objects.create(post=other, author=self.user, content='Old')
+        CounterService.adjust_post_comments(other.pk, 1)
+
+        def comment_on_one_delete_from_other():
+            self.client.post(reverse('comment-list'), {'post': self.post.pk, 'content': 'New'})
+            self.client.delete(reverse('comment-detail', kwargs={'pk': comment.pk}))
+        self.assertRevalidates(reverse('post-list'), comment_on_one_delete_from_other)
+
+    def test_detail(self):
+        self.assertRevalidates(reverse('post-detail', kwargs={'pk': self.post.pk}), self.like_post)
+
+    def rename_author(self):
+        self.author.username = 'renamed'
+        self.author.save()
+
+    def test_detail_revalidates_on_author_rename(self):
+        url = reverse('post-detail', kwargs={'pk': self.post.pk})
+        self.assertRevalidates(url, self.rename_author)
+        self.assertEqual(self.client.get(url).data['author'], 'renamed')
+
+    def test_list_revalidates_on_author_rename(self):
+        Post.objects.create(author=self.user, title='Newer', content='Content')
+        self.assertRevalidates(reverse('post-list'), self.rename_author)
+
+    def test_feed(self):
+        def new_post():
+            TimelineService.fan_out_post(
+                Post.objects.create(author=self.author, title='Newer', content='Content')
+            )
+        self.assertRevalidates(reverse('post-feed'), new_post)
+
+    def test_feed_revalidates_on_viewer_like(self):
+        self.assertRevalidates(reverse('post-feed'), self.like_post)
+
+    def test_feed_revalidation_reads_only_the_page(self):
+        for i in range(30):
+            TimelineService.fan_out_post(
+                Post.objects.create(author=self.author, title=f'Post {i}', content='Content')
+            )
+        url = reverse('post-feed')
+        etag = self.client.get(url)['ETag']
+        # The page of timeline entries; the versions come from the cache
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class PostSearchTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='searcher',
+            email='searcher@example.com',
+            password='testpass123'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+        self.python = Post.objects.create(
+            author=self.user, title='Python tips', content='Generators and python decorators'
+        )
+        self.django = Post.objects.create(
+            author=self.user, title='Django models', content='Managers and python querysets'
+        )
+        self.cooking = Post.objects.create(
+            author=self.user, title='Cooking', content='How to bake bread'
+        )
+
+    def search(self, term):
+        response = self.client.get(reverse('post-list'), {'search': term})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data['results']]
+
+    def test_prefix_match_ranked_by_relevance(self):
+        self.assertEqual(self.search('pyth'), [self.python.pk, self.django.pk])
+
+    def test_search_by_author_username(self):
+        self.assertEqual(len(self.search('searcher')), 3)
+
+    def test_author_username_matches_by_prefix_with_other_terms(self):
+        self.assertEqual(len(self.search('searc')), 3)
+        self.assertEqual(self.search('searc bread'), [self.cooking.pk])
+
+    def test_username_change_reindexes_posts(self):
+        self.user.username = 'renamed'
+        self.user.save()
+        self.assertEqual(len(self.search('renamed')), 3)
+        self.assertEqual(self.search('searcher'), [])
+
+    def test_postgres_backend_indexes_usernames_like_sqlite(self):
+        queryset = PostgresFullTextBackend().search(Post.objects.all(), ['searc'], None, None)
+        sql = str(queryset.query)
+        self.assertIn('author_username', PostgresFullTextBackend.document)
+        self.assertNotIn('accounts_user', sql)
+        self.assertEqual(PostgresFullTextBackend.build_query(['searc', 'bread']), 'searc:* & bread:*')
+
+    def test_index_follows_updates_and_deletes(self):
+        self.cooking.title = 'Baking with python'
+        self.cooking.save()
+        self.assertIn(self.cooking.pk, self.search('python'))
+
+        self.python.delete()
+        self.assertNotIn(self.python.pk, self.search('python'))
+
 
-class PermissionTest(APITestCase):
+class PermissionTest(QueryBudgetMixin, APITestCase):
     def setUp(self):
         self.user1 = User.objects.create_user(
             username='user1',
@@ -11,7 +11,7 @@ urlpatterns = [
     # Include router URLs
     path('', include(router.urls)),
     # Explicit feed route
-    path('feed/', PostViewSet.as_view({'get': 'feed'}), name='post-feed'),
+    path('feed/', PostViewSet.as_view({'get': 'feed'}, **PostViewSet.feed.kwargs), name='post-feed'),
     # Explicit like and unlike routes
     path('posts/<int:pk>/like/', PostViewSet.as_view({'post': 'like'}), name='post-like'),
     path('posts/<int:pk>/unlike/', PostViewSet.as_view({'post': 'unlike'}), name='post-unlike'),
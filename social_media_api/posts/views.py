@@ -1,10 +1,11 @@
-from rest_framework import viewsets, status, filters, permissions, generics
+from rest_framework import viewsets, filters, permissions, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
-from .models import Post, Comment, Like
+from django.db.models import Prefetch
+import copy
+from .models import Post, Comment, Like, TimelineEntry
 from .serializers import (
     PostListSerializer, 
     PostDetailSerializer, 
@@ -15,8 +16,13 @@ from .serializers import (
     LikeSerializer
 )
 from notifications.services import NotificationService
-from notifications.models import Notification
 from .permissions import IsOwnerOrReadOnly
+from .services import TimelineService, CounterService, LikeService
+from .pagination import PostPagination, TimelineCursorPagination, CommentCursorPagination
+from .search import PostSearchFilter
+from .cache import PostResponseCache
+from .conditional import make_etag, queryset_fingerprint, not_modified, with_etag
+from social_media_api.pagination import KeysetPagination
 
 
 class PostViewSet(viewsets.ModelViewSet):
@@ -26,11 +32,20 @@ class PostViewSet(viewsets.ModelViewSet):
     """
     queryset = Post.objects.all()
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, PostSearchFilter]
     filterset_fields = ['author']
-    search_fields = ['title', 'content', 'author__username']
+    search_fields = ['title', 'content', 'author_username']
     ordering_fields = ['created_at', 'updated_at', 'likes_count', 'comments_count']
     ordering = ['-created_at']
+    pagination_class = PostPagination
+    query_budget = {
+        'list': 4,
+        'retrieve': 3,
+        'retrieve_with_comments': 5,
+        'my_posts': 4,
+        'liked_posts': 4,
+        'feed': 6,
+    }
 
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -44,66 +59,132 @@ class PostViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return posts with related data."""
-        return Post.objects.select_related('author').prefetch_related('likes', 'comments')
+        queryset = Post.objects.select_related('author')
+        if self.action == 'retrieve_with_comments':
+            queryset = queryset.prefetch_related(
+                Prefetch('comments', queryset=Comment.objects.select_related('author'))
+            )
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """List posts, answering 304 when the filtered page is unchanged."""
+        queryset = self.filter_queryset(self.get_queryset())
+        fingerprint = queryset_fingerprint(queryset)
+        # The fingerprint's row count doubles as the paginator's count
+        self.known_count = fingerprint[0]
+        etag = make_etag('list', request.get_full_path(), *fingerprint)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        return with_etag(super().list(request, *args, **kwargs), etag)
 
     def perform_create(self, serializer):
         """Set the author to the current user when creating a post."""
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        TimelineService.schedule_fan_out(post)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def like(self, request, pk=None):
         """Like or unlike a post."""
-        post = generics.get_object_or_404(Post, pk=pk)
+        post = generics.get_object_or_404(Post.objects.select_related('author'), pk=pk)
         user = request.user
         
-        # Check if user has already liked this post
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
+        liked, likes_count = LikeService.toggle(post, user)
         
-        if not created:
-            # Unlike the post
-            like.delete()
+        if not liked:
             message = 'Post unliked'
         else:
-            # Like the post and create notification
-            Notification.objects.create(
-                recipient=post.author,
-                actor=user,
-                verb='like',
-                target=post
-            )
+            # Create notification for the post author
+            NotificationService.create_like_notification(post, user)
             message = 'Post liked'
         
         return Response({
             'message': message,
-            'likes_count': post.post_likes.count()
+            'likes_count': likes_count
         })
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def unlike(self, request, pk=None):
         """Unlike a post."""
         post = generics.get_object_or_404(Post, pk=pk)
-        user = request.user
         
-        try:
-            like = Like.objects.get(user=user, post=post)
-            like.delete()
-            message = 'Post unliked'
-        except Like.DoesNotExist:
-            message = 'Post was not liked'
+        unliked, likes_count = LikeService.unlike(post, request.user)
+        message = 'Post unliked' if unliked else 'Post was not liked'
         
         return Response({
             'message': message,
-            'likes_count': post.post_likes.count()
+            'likes_count': likes_count
         })
 
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve a post, serving the body from the versioned cache."""
+        return self._cached_post_response(request, 'detail')
+
     @action(detail=True, methods=['get'])
     def retrieve_with_comments(self, request, pk=None):
         """Retrieve a post with all its comments."""
-        post = self.get_object()
-        serializer = self.get_serializer(post)
-        return Response(serializer.data)
+        return self._cached_post_response(request, 'with_comments')
 
-    @action(detail=False, methods=['get'])
+    def _cached_post_response(self, request, variant):
+        """
+        Serve a post body from the cache, rendering and storing it on a miss.
+        The cached body is viewer-independent; is_liked flags are merged in
+        per request.
+        """
+        try:
+            post_id = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            post_id = None
+
+        if post_id is None:
+            return Response(self.get_serializer(self.get_object()).data)
+
+        # Likes and comment likes bump the version too, so the version and
+        # the viewer identify the body including its is_liked flags.
+        version, body = PostResponseCache.get(post_id, variant)
+        post = None
+        if version is None:
+            # Resolve a missing post to a 404 before creating its version key
+            post = self.get_object()
+            version = PostResponseCache.get_version(post_id)
+        etag = make_etag(variant, post_id, version, request.user.pk)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        if body is None:
+            data = self.get_serializer(post or self.get_object()).data
+            PostResponseCache.set(post_id, variant, version, self._without_viewer_state(data))
+            return with_etag(Response(data), etag)
+        return with_etag(Response(self._with_viewer_state(request, body)), etag)
+
+    @staticmethod
+    def _without_viewer_state(data):
+        """Return a copy of a serialized post with every is_liked flag cleared."""
+        body = copy.deepcopy(dict(data))
+        body['is_liked'] = False
+        for comment in body.get('comments', []):
+            comment['is_liked'] = False
+        return body
+
+    @staticmethod
+    def _with_viewer_state(request, body):
+        """Set the viewer's is_liked flags on a cached post body."""
+        user = request.user
+        if not user.is_authenticated:
+            return body
+        body['is_liked'] = Like.objects.filter(post_id=body['id'], user=user).exists()
+        comments = body.get('comments')
+        if comments:
+            liked = set(Comment.likes.through.objects.filter(
+                user=user,
+                comment_id__in=[comment['id'] for comment in comments]
+            ).values_list('comment_id', flat=True))
+            for comment in comments:
+                comment['is_liked'] = comment['id'] in liked
+        return body
+
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def my_posts(self, request):
         """Get posts by the current user."""
         posts = self.get_queryset().filter(author=request.user)
@@ -115,7 +196,7 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(posts, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'], pagination_class=KeysetPagination)
     def liked_posts(self, request):
         """Get posts liked by the current user."""
         posts = self.get_queryset().filter(likes=request.user)
@@ -127,20 +208,51 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(posts, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAuthenticated],
+        pagination_class=TimelineCursorPagination
+    )
     def feed(self, request):
         """Get feed of posts from users that the current user follows."""
-        # Get posts from users that the current user follows
-        following_users = request.user.following.all()
-        posts = Post.objects.filter(author__in=following_users).order_by('-created_at')
-        
-        page = self.paginate_queryset(posts)
+        # Read the pre-sorted post IDs from the materialized timeline
+        entries = TimelineEntry.objects.filter(
+            user=request.user
+        ).order_by('-post_created_at', '-post_id').only('post_id', 'post_created_at')
+
+        page = self.paginate_queryset(entries)
+        links = ()
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(posts, many=True)
-        return Response(serializer.data)
+            paginator = self.paginator
+            links = (paginator.count, paginator.get_next_link(), paginator.get_previous_link())
+        else:
+            page = list(entries)
+
+        # Fingerprint just this page: its posts and their cached versions,
+        # which edits, comments and likes (the viewer's included) all bump.
+        versions = PostResponseCache.get_versions([entry.post_id for entry in page])
+        etag = make_etag(
+            'feed',
+            request.get_full_path(),
+            request.user.pk,
+            *links,
+            *(f'{entry.post_id}.{versions[entry.post_id]}' for entry in page)
+        )
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        serializer = self.get_serializer(self._hydrate_posts(page), many=True)
+        if links:
+            return with_etag(self.get_paginated_response(serializer.data), etag)
+        return with_etag(Response(serializer.data), etag)
+
+    def _hydrate_posts(self, entries):
+        """Load the posts of timeline entries in one query, keeping their order."""
+        post_ids = [entry.post_id for entry in entries]
+        posts = self.get_queryset().in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
 
 
 class CommentViewSet(viewsets.ModelViewSet):
@@ -154,6 +266,11 @@ class CommentViewSet(viewsets.ModelViewSet):
     filterset_fields = ['post', 'author']
     ordering_fields = ['created_at', 'updated_at', 'likes_count']
     ordering = ['created_at']
+    pagination_class = CommentCursorPagination
+    query_budget = {
+        'list': 3,
+        'retrieve': 3,
+    }
 
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -163,30 +280,32 @@ class CommentViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """Return comments with related data."""
-        return Comment.objects.select_related('author', 'post').prefetch_related('likes')
+        return Comment.objects.select_related('author', 'post')
 
     def perform_create(self, serializer):
         """Set the author when creating a comment and create notification."""
         comment = serializer.save(author=self.request.user)
+        CounterService.adjust_post_comments(comment.post_id, 1)
         # Create notification for the post author
         NotificationService.create_comment_notification(comment.post, self.request.user)
 
+    def perform_destroy(self, instance):
+        """Delete a comment and update the post's comment counter."""
+        post_id = instance.post_id
+        instance.delete()
+        CounterService.adjust_post_comments(post_id, -1)
+
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def like(self, request, pk=None):
         """Like or unlike a comment."""
         comment = self.get_object()
-        user = request.user
         
-        if comment.likes.filter(id=user.id).exists():
-            comment.likes.remove(user)
-            message = 'Comment unliked'
-        else:
-            comment.likes.add(user)
-            message = 'Comment liked'
+        liked, likes_count = LikeService.toggle(comment, request.user)
+        message = 'Comment liked' if liked else 'Comment unliked'
         
         return Response({
             'message': message,
-            'likes_count': comment.likes_count
+            'likes_count': likes_count
         })
 
     @action(detail=False, methods=['get'])
@@ -0,0 +1,150 @@
+"""
+Health checks.
+
+Each check is a function that returns a ``(status, message)`` pair or
+raises. ``run_checks`` runs them concurrently on a shared thread pool, gives
+up on any that exceed ``HEALTH_CHECK_TIMEOUT`` seconds, and records each
+check's latency. The report is reused for ``HEALTH_CHECK_CACHE_SECONDS``, and
+concurrent callers share a single run, so a burst of probes costs one round
+of checks.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+HEALTHY = 'healthy'
+UNHEALTHY = 'unhealthy'
+
+
+def _timeout():
+    return getattr(settings, 'HEALTH_CHECK_TIMEOUT', 2.0)
+
+
+def check_database():
+    # Runs on a pool thread, whose connection is its own: close it afterwards
+    # so idle pool threads do not each hold a database connection open
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+    finally:
+        connection.close()
+    return HEALTHY, 'Database connection successful'
+
+
+def check_cache():
+    cache.set('health_check', 'ok', 10)
+    if cache.get('health_check') != 'ok':
+        return UNHEALTHY, 'Cache did not return the value just written'
+    return HEALTHY, 'Cache connection successful'
+
+
+_redis_client = None
+_redis_lock = threading.Lock()
+
+
+def _get_redis_client(url):
+    # One client, and so one connection pool, per process
+    global _redis_client
+    with _redis_lock:
+        if _redis_client is None:
+            _redis_client = redis.Redis.from_url(
+                url, socket_timeout=_timeout(), socket_connect_timeout=_timeout()
+            )
+        return _redis_client
+
+
+def check_redis():
+    if not REDIS_AVAILABLE:
+        return 'not_available', 'Redis module not installed'
+    url = getattr(settings, 'HEALTH_CHECK_REDIS_URL', None)
+    if not url:
+        return 'not_configured', 'Redis not configured'
+    _get_redis_client(url).ping()
+    return HEALTHY, 'Redis connection successful'
+
+
+CHECKS = {
+    'database': check_database,
+    'cache': check_cache,
+    'redis': check_redis,
+}
+
+_executor = ThreadPoolExecutor(max_workers=2 * len(CHECKS), thread_name_prefix='health-check')
+
+
+def _timed(check):
+    start = time.perf_counter()
+    try:
+        status, message = check()
+    except Exception as e:
+        status, message = UNHEALTHY, f'{type(e).__name__}: {e}'
+    return status, message, time.perf_counter() - start
+
+
+def run_checks(checks=None):
+    """
+    Run every check concurrently and return {name: result}. A check still
+    running after the timeout is reported unhealthy; it is left to finish in
+    the background.
+    """
+    checks = checks or CHECKS
+    timeout = _timeout()
+    futures = {name: _executor.submit(_timed, check) for name, check in checks.items()}
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if future.done():
+            status, message, latency = future.result()
+        else:
+            status, message, latency = UNHEALTHY, f'Timed out after {timeout}s', timeout
+        results[name] = {
+            'status': status,
+            'message': message,
+            'latency_ms': round(latency * 1000, 2),
+        }
+    return results
+
+
+_report = None
+_report_expires = 0.0
+_report_lock = threading.Lock()
+
+
+def get_report():
+    """
+    Return (healthy, checks, age in seconds) from the cached report,
+    running the checks if it has expired.
+    """
+    global _report, _report_expires
+    with _report_lock:
+        now = time.monotonic()
+        if _report is None or now >= _report_expires:
+            checks = run_checks()
+            _report = (
+                all(result['status'] != UNHEALTHY for result in checks.values()),
+                checks,
+                time.monotonic(),
+            )
+            _report_expires = _report[2] + getattr(settings, 'HEALTH_CHECK_CACHE_SECONDS', 5)
+        healthy, checks, checked_at = _report
+        return healthy, checks, round(time.monotonic() - checked_at, 3)
+
+
+def reset_report():
+    """Forget the cached report."""
+    global _report
+    with _report_lock:
+        _report = None
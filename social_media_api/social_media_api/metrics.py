@@ -0,0 +1,149 @@
+"""
+Prometheus metrics.
+
+``MetricsMiddleware`` records, per URL route, request counts and latency,
+the number and time of database queries, and response sizes. Application
+caches report hits and misses through ``record_cache``. ``metrics_view``
+serves everything in the Prometheus text format on ``/metrics`` to scrapers
+presenting ``METRICS_AUTH_TOKEN``.
+
+Under gunicorn each worker is a separate process, so metrics are written to
+files in ``PROMETHEUS_MULTIPROC_DIR`` (set up in ``gunicorn.conf.py``) and
+merged at scrape time; without that variable they live in process memory,
+which is right for the development server.
+
+Everything is a no-op when ``prometheus_client`` is not installed.
+"""
+
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+
+if PROMETHEUS_AVAILABLE:
+    REQUESTS = Counter(
+        'http_requests_total', 'HTTP requests', ['method', 'route', 'status']
+    )
+    REQUEST_LATENCY = Histogram(
+        'http_request_duration_seconds', 'Time to produce a response', ['method', 'route'],
+        buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+    )
+    DB_QUERIES = Histogram(
+        'http_request_db_queries', 'Database queries per request', ['route'],
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+    )
+    DB_TIME = Histogram(
+        'http_request_db_duration_seconds', 'Time spent in database queries per request', ['route'],
+        buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+    )
+    RESPONSE_SIZE = Histogram(
+        'http_response_size_bytes', 'Response body size', ['route'],
+        buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576)
+    )
+    CACHE_LOOKUPS = Counter(
+        'cache_lookups_total', 'Application cache lookups', ['cache', 'result']
+    )
+
+
+def record_cache(name, hit):
+    """Count a lookup in one of the application caches."""
+    if PROMETHEUS_AVAILABLE:
+        CACHE_LOOKUPS.labels(cache=name, result='hit' if hit else 'miss').inc()
+
+
+class _QueryTimer:
+    """Database execute wrapper that counts queries and their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    # The URL pattern, not the path, to keep label cardinality bounded
+    return match.route if match is not None else '<unmatched>'
+
+
+class MetricsMiddleware:
+    """
+    Record latency, database usage and response size for every request.
+    Install it first in MIDDLEWARE so the whole stack is timed.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not PROMETHEUS_AVAILABLE:
+            return self.get_response(request)
+
+        timer = _QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        route = _route(request)
+        REQUESTS.labels(method=request.method, route=route, status=response.status_code).inc()
+        REQUEST_LATENCY.labels(method=request.method, route=route).observe(elapsed)
+        DB_QUERIES.labels(route=route).observe(timer.count)
+        DB_TIME.labels(route=route).observe(timer.duration)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(route=route).observe(len(response.content))
+        return response
+
+
+def _scrape_allowed(request):
+    token = getattr(settings, 'METRICS_AUTH_TOKEN', '')
+    if not token:
+        return settings.DEBUG
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    return scheme.lower() == 'bearer' and constant_time_compare(credentials, token)
+
+
+def metrics_view(request):
+    """
+    Expose metrics in the Prometheus text format.
+
+    Scrapers authenticate with ``Authorization: Bearer <METRICS_AUTH_TOKEN>``.
+    Without a token configured the endpoint is only served when DEBUG is on.
+
+    GET /metrics
+    """
+    if not _scrape_allowed(request):
+        return HttpResponse(
+            'Metrics require a bearer token\n', status=401, content_type='text/plain',
+            headers={'WWW-Authenticate': 'Bearer realm="metrics"'}
+        )
+    if not PROMETHEUS_AVAILABLE:
+        return HttpResponse('prometheus_client is not installed\n', status=501, content_type='text/plain')
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
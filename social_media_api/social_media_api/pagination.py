@@ -0,0 +1,194 @@
+"""
+Pagination classes shared by the API apps.
+"""
+
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor (keyset) pagination.
+
+    Pages are selected with a ``WHERE (created_at, id) < (?, ?)`` style
+    filter instead of an ``OFFSET``, so deep pages cost the same as the first
+    one. The total ``count`` is only computed when the client asks for it
+    with ``?with_count=true``.
+
+    ``ordering`` must name a unique, non-null key and every field must sort
+    in the same direction. When the view has an ``OrderingFilter`` and the
+    client picked an ordering, the cursor is keyed on that ordering instead,
+    with ``id`` appended as a tie-breaker.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'with_count'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.fields = [field.lstrip('-') for field in self.ordering]
+        self.descending = self.ordering[0].startswith('-')
+
+        cursor = self.decode_cursor(request)
+        self.reverse = cursor is not None and cursor['reverse']
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() == 'true':
+            self.count = queryset.count()
+
+        if cursor is not None:
+            queryset = queryset.filter(self.get_position_filter(cursor['position']))
+
+        if self.reverse:
+            queryset = queryset.order_by(*self.get_reversed_ordering())
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        if self.reverse:
+            self.has_next = cursor is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = cursor is not None
+
+        self.page = results
+        return results
+
+    def get_ordering(self, request, queryset, view):
+        for backend in getattr(view, 'filter_backends', ()):
+            if not issubclass(backend, OrderingFilter):
+                continue
+            backend = backend()
+            if backend.ordering_param not in request.query_params:
+                break
+            ordering = [
+                field for field in backend.get_ordering(request, queryset, view) or ()
+                if field.lstrip('-') not in ('id', 'pk')
+            ]
+            if not ordering:
+                break
+            descending = ordering[0].startswith('-')
+            if any(field.startswith('-') != descending for field in ordering):
+                raise ValidationError({
+                    backend.ordering_param: 'All ordering fields must sort in the same direction.'
+                })
+            return tuple(ordering) + ('-id' if descending else 'id',)
+        return type(self).ordering
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(
+                    request.query_params[self.page_size_query_param],
+                    strict=True,
+                    cutoff=self.max_page_size
+                )
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_reversed_ordering(self):
+        return [field[1:] if field.startswith('-') else '-' + field for field in self.ordering]
+
+    def get_position_filter(self, position):
+        """
+        Build ``(a, b) < (x, y)`` as ``a < x OR (a = x AND b < y)``.
+        """
+        forward = self.descending != self.reverse
+        lookup = 'lt' if forward else 'gt'
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.fields, position):
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def get_position(self, item):
+        if isinstance(item, dict):
+            return [item[field] for field in self.fields]
+        return [getattr(item, field) for field in self.fields]
+
+    def encode_cursor(self, item, reverse):
+        position = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in self.get_position(item)
+        ]
+        payload = json.dumps(
+            {'p': position, 'o': list(self.ordering), 'r': int(reverse)}, separators=(',', ':')
+        )
+        encoded = b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            position = payload['p']
+            # A cursor only makes sense for the ordering it was issued for
+            if payload.get('o', list(type(self).ordering)) != list(self.ordering):
+                raise ValueError
+            if len(position) != len(self.fields):
+                raise ValueError
+            return {'position': position, 'reverse': bool(payload.get('r'))}
+        except (TypeError, ValueError, KeyError, UnicodeError, BinasciiError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response_data = OrderedDict()
+        if self.count is not None:
+            response_data['count'] = self.count
+        response_data['next'] = self.get_next_link()
+        response_data['previous'] = self.get_previous_link()
+        response_data['results'] = data
+        return Response(response_data)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
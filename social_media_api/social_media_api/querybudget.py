@@ -0,0 +1,137 @@
+"""
+Query budgets and N+1 detection.
+
+``QueryBudgetMiddleware`` records the SQL run while serving each request
+and checks it against two rules:
+
+- the view's query budget, declared with a ``query_budget`` attribute: an
+  int for the whole view, or a dict of ``{action: int}`` on a viewset
+  (function views use the ``query_budget`` decorator)
+- repeated query shapes: the same statement with different parameters run
+  ``QUERY_REPEAT_THRESHOLD`` or more times, the signature of an N+1
+
+``QUERY_BUDGET_MODE`` decides what a violation does: ``warn`` logs it
+(production), ``raise`` raises ``QueryBudgetExceeded`` (tests, see
+``social_media_api.testing``) and ``off`` disables recording.
+"""
+
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SAVEPOINT = re.compile(r'^(?:SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """A request ran more queries than its budget, or repeated a query shape."""
+
+
+def query_budget(budget):
+    """Declare the query budget of a function view; apply it outermost."""
+    def decorator(view):
+        view.query_budget = budget
+        return view
+    return decorator
+
+
+def query_shape(sql):
+    """Normalize a statement so queries differing only in parameters compare equal."""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = shape.replace('%s', '?')
+    return _IN_LIST.sub('IN (...)', shape)
+
+
+class QueryRecorder:
+    """
+    Context manager that records every statement run on any database
+    connection of the current thread.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stack.close()
+
+    def __len__(self):
+        return len(self.queries)
+
+    def repeated_shapes(self, threshold=None):
+        """Return {shape: count} for shapes run at least threshold times."""
+        threshold = threshold or getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+        shapes = Counter(query_shape(sql) for sql in self.queries if not _SAVEPOINT.match(sql))
+        return {shape: count for shape, count in shapes.items() if count >= threshold}
+
+
+def view_budget(view_func, method):
+    """Return the query budget declared for a view and HTTP method, or None."""
+    budget = getattr(view_func, 'query_budget', None)
+    view_class = getattr(view_func, 'cls', None)
+    if budget is None and view_class is not None:
+        budget = getattr(view_class, 'query_budget', None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, 'actions', None) or {}
+        budget = budget.get(actions.get(method.lower()))
+    return budget
+
+
+def check_queries(recorder, budget, label):
+    """Return a list of violation messages for a recorded request."""
+    problems = []
+    if budget is not None and len(recorder) > budget:
+        problems.append(f'{label} ran {len(recorder)} queries, over its budget of {budget}')
+    for shape, count in recorder.repeated_shapes().items():
+        problems.append(f'{label} ran the same query {count} times (possible N+1): {shape}')
+    return problems
+
+
+class QueryBudgetMiddleware:
+    """
+    Enforce per-view query budgets and flag repeated query shapes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = getattr(settings, 'QUERY_BUDGET_MODE', 'warn')
+        if mode == 'off':
+            return self.get_response(request)
+
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+
+        view_func = getattr(request, '_query_budget_view', None)
+        if view_func is None:
+            return response
+        budget = view_budget(view_func, request.method)
+        problems = check_queries(recorder, budget, f'{request.method} {request.path}')
+        if problems:
+            if mode == 'raise':
+                raise QueryBudgetExceeded('\n'.join(problems))
+            for problem in problems:
+                logger.warning(problem)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget_view = view_func
@@ -52,6 +52,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'social_media_api.metrics.MetricsMiddleware',
+    'social_media_api.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -154,7 +156,8 @@ AUTH_USER_MODEL = 'accounts.User'
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
+        'accounts.authentication.SignedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -168,6 +171,84 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Token authentication cache (see accounts.authentication)
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+AUTH_TOKEN_LOCAL_CACHE_TIMEOUT = 5
+AUTH_TOKEN_LOCAL_CACHE_SIZE = 1024
+
+# Signed access/refresh tokens instead of stored API tokens (see accounts.tokens)
+AUTH_SIGNED_TOKENS = os.environ.get('AUTH_SIGNED_TOKENS', 'False').lower() == 'true'
+AUTH_ACCESS_TOKEN_LIFETIME = 300
+AUTH_REFRESH_TOKEN_LIFETIME = 14 * 86400
+
+# Square profile picture thumbnails (pixels) generated by process_profile_pictures
+PROFILE_PICTURE_RENDITIONS = {'small': 64, 'medium': 200, 'large': 512}
+PROFILE_PICTURE_FORMATS = ('webp', 'jpeg')
+# Seconds before a claimed but unfinished job is handed to another worker
+PROFILE_PICTURE_JOB_LEASE = 600
+
+# Home timeline (fan-out-on-write feed) configuration
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+# 'immediate' fans out inside the request; 'inprocess' after commit on a background thread
+TIMELINE_FANOUT_BACKEND = os.environ.get('TIMELINE_FANOUT_BACKEND', 'immediate')
+TIMELINE_BACKFILL_LIMIT = 200
+
+# Maximum number of users per bulk relationship lookup
+RELATIONSHIP_LOOKUP_LIMIT = 300
+
+# Who-to-follow suggestions (see the compute_follow_suggestions command)
+FOLLOW_SUGGESTION_LIMIT = 50
+FOLLOW_SUGGESTION_CACHE_TIMEOUT = 86400
+
+# Seconds a rendered post body stays in the versioned response cache, and
+# how long an unread post's version key is kept (must be longer)
+POST_CACHE_TIMEOUT = 300
+POST_CACHE_VERSION_TIMEOUT = 3600
+
+# Post search backend (dotted path). Leave unset to pick the full-text
+# backend for the database: FTS5 on SQLite, tsvector/GIN on PostgreSQL.
+POST_SEARCH_BACKEND = os.environ.get('POST_SEARCH_BACKEND') or None
+
+# Notification dispatch: 'immediate', 'inprocess', 'outbox' or a dotted path
+NOTIFICATION_DISPATCH_BACKEND = os.environ.get('NOTIFICATION_DISPATCH_BACKEND', 'immediate')
+NOTIFICATION_DISPATCH_BATCH_SIZE = 500
+NOTIFICATION_DISPATCH_FLUSH_INTERVAL = 1.0
+
+# Likes and comments on the same target within this many seconds share one notification
+NOTIFICATION_AGGREGATED_VERBS = ('like', 'comment')
+NOTIFICATION_AGGREGATION_WINDOW = 86400
+NOTIFICATION_AGGREGATION_SAMPLE_SIZE = 3
+
+# Seconds a user's unread notification count stays cached
+NOTIFICATION_UNREAD_CACHE_TIMEOUT = 60
+
+# Live notification streams (server-sent events, served over ASGI)
+NOTIFICATION_STREAM_BACKEND = os.environ.get('NOTIFICATION_STREAM_BACKEND', 'inprocess')
+NOTIFICATION_STREAM_REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+NOTIFICATION_STREAM_HEARTBEAT = 15
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+NOTIFICATION_STREAM_TICKET_LIFETIME = 60
+
+# Notification retention (see the prune_notifications command)
+NOTIFICATION_READ_RETENTION_DAYS = 30
+NOTIFICATION_UNREAD_RETENTION_DAYS = 180
+NOTIFICATION_ARCHIVE_RETENTION_DAYS = 365
+NOTIFICATION_PRUNE_BATCH_SIZE = 1000
+NOTIFICATION_PRUNE_SLEEP = 0.1
+
+# Per-view query budgets and N+1 detection: 'warn', 'raise' or 'off'
+QUERY_BUDGET_MODE = os.environ.get('QUERY_BUDGET_MODE', 'warn')
+QUERY_REPEAT_THRESHOLD = 3
+
+# Detailed health check (see social_media_api.health)
+HEALTH_CHECK_TIMEOUT = 2.0
+HEALTH_CHECK_CACHE_SECONDS = 5
+HEALTH_CHECK_REDIS_URL = os.environ.get('REDIS_URL')
+
+# Bearer token Prometheus presents when scraping /metrics; without one the
+# endpoint is only served when DEBUG is on
+METRICS_AUTH_TOKEN = os.environ.get('METRICS_AUTH_TOKEN', '')
+
 # Media files configuration
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
@@ -128,6 +128,15 @@ CACHES = {
     }
 }
 
+# Fan new posts out to follower timelines after the response, not inside it
+TIMELINE_FANOUT_BACKEND = os.environ.get('TIMELINE_FANOUT_BACKEND', 'inprocess')
+
+# Write notifications through the outbox; run process_notification_outbox as a worker
+NOTIFICATION_DISPATCH_BACKEND = os.environ.get('NOTIFICATION_DISPATCH_BACKEND', 'outbox')
+
+# Relay live notification events between workers through Redis
+NOTIFICATION_STREAM_BACKEND = os.environ.get('NOTIFICATION_STREAM_BACKEND', 'redis')
+
 # Celery configuration for background tasks (optional)
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://localhost:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND', 'redis://localhost:6379/0')
@@ -153,6 +162,8 @@ if os.environ.get('USE_S3') == 'TRUE':
 
 # Production-specific middleware
 MIDDLEWARE = [
+    'social_media_api.metrics.MetricsMiddleware',
+    'social_media_api.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # For serving static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -0,0 +1,34 @@
+"""
+Test helpers.
+"""
+
+from django.test import override_settings
+
+from .querybudget import QueryRecorder, check_queries
+
+
+class QueryBudgetMixin:
+    """
+    Fail a test when a request exceeds its view's query budget or repeats a
+    query shape, instead of only logging it.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._query_budget_settings = override_settings(QUERY_BUDGET_MODE='raise')
+        cls._query_budget_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._query_budget_settings.disable()
+        super().tearDownClass()
+
+    def assertNoRepeatedQueries(self, func, *args, budget=None, **kwargs):
+        """Call func and fail if it repeats a query shape or runs over budget."""
+        with QueryRecorder() as recorder:
+            result = func(*args, **kwargs)
+        problems = check_queries(recorder, budget, getattr(func, '__name__', repr(func)))
+        if problems:
+            self.fail('\n'.join(problems))
+        return result
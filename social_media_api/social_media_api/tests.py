@@ -0,0 +1,157 @@
+import time
+from unittest import mock, skipUnless
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from accounts.models import User
+from posts.views import PostViewSet
+from . import health, metrics
+from .querybudget import QueryBudgetExceeded, QueryRecorder, query_shape
+from .testing import QueryBudgetMixin
+
+
+class HealthCheckTest(TestCase):
+    def setUp(self):
+        health.reset_report()
+        self.addCleanup(health.reset_report)
+
+    def test_detailed_health_reports_each_check_with_latency(self):
+        response = self.client.get(reverse('detailed-health-check'))
+        self.assertEqual(response.status_code, 200)
+        checks = response.json()['checks']
+        self.assertEqual(set(checks), {'database', 'cache', 'redis'})
+        self.assertEqual(checks['database']['status'], 'healthy')
+        self.assertIn('latency_ms', checks['cache'])
+
+    def test_report_is_cached_between_probes(self):
+        calls = []
+        with mock.patch.dict(health.CHECKS, {'counted': lambda: calls.append(1) or ('healthy', 'ok')}):
+            self.client.get(reverse('detailed-health-check'))
+            response = self.client.get(reverse('detailed-health-check'))
+        self.assertEqual(len(calls), 1)
+        self.assertIn('counted', response.json()['checks'])
+
+    @override_settings(HEALTH_CHECK_TIMEOUT=0.05)
+    def test_slow_check_times_out_without_blocking_others(self):
+        def slow():
+            time.sleep(0.5)
+            return 'healthy', 'ok'
+
+        start = time.monotonic()
+        with mock.patch.dict(health.CHECKS, {'slow': slow}):
+            response = self.client.get(reverse('detailed-health-check'))
+        self.assertLess(time.monotonic() - start, 0.4)
+        self.assertEqual(response.status_code, 503)
+        checks = response.json()['checks']
+        self.assertEqual(checks['slow']['status'], 'unhealthy')
+        self.assertEqual(checks['database']['status'], 'healthy')
+
+    def test_failing_check_marks_service_unhealthy(self):
+        def broken():
+            raise ConnectionError('refused')
+
+        with mock.patch.dict(health.CHECKS, {'broken': broken}):
+            response = self.client.get(reverse('detailed-health-check'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['checks']['broken']['message'], 'ConnectionError: refused')
+
+    def test_database_check_closes_its_thread_connection(self):
+        # The in-memory test database ignores close(), so watch the call instead
+        with mock.patch.object(health, 'connection') as db:
+            self.assertEqual(health.check_database()[0], 'healthy')
+            db.close.assert_called_once_with()
+
+            db.cursor.side_effect = ConnectionError('refused')
+            with self.assertRaises(ConnectionError):
+                health.check_database()
+            self.assertEqual(db.close.call_count, 2)
+
+    def test_basic_health_runs_no_checks(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('health-check'))
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(METRICS_AUTH_TOKEN='scrape-secret')
+class MetricsAccessTest(TestCase):
+    def test_scrape_requires_the_bearer_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Bearer realm="metrics"')
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertIn(response.status_code, (200, 501))
+
+    @override_settings(METRICS_AUTH_TOKEN='')
+    def test_without_a_token_metrics_are_only_served_in_debug(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        with override_settings(DEBUG=True):
+            self.assertIn(self.client.get(reverse('metrics')).status_code, (200, 501))
+
+
+@skipUnless(metrics.PROMETHEUS_AVAILABLE, 'prometheus_client is not installed')
+@override_settings(METRICS_AUTH_TOKEN='scrape-secret')
+class MetricsTest(TestCase):
+    def scrape(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_route(self):
+        self.client.get(reverse('health-check'))
+        output = self.scrape()
+        self.assertIn('http_requests_total{method="GET",route="health/",status="200"}', output)
+        self.assertIn('http_request_duration_seconds_bucket{le="0.005",method="GET",route="health/"}', output)
+        self.assertIn('http_response_size_bytes_count{route="health/"}', output)
+
+    def test_database_queries_are_counted(self):
+        self.client.get(reverse('detailed-health-check'))
+        self.client.post(reverse('login'), {'username': 'nobody', 'password': 'wrong'})
+        output = self.scrape()
+        self.assertIn('http_request_db_queries_count{route="api/accounts/login/"}', output)
+        self.assertNotIn('http_request_db_queries_sum{route="api/accounts/login/"} 0.0', output)
+
+    def test_cache_lookups_are_counted(self):
+        metrics.record_cache('example', True)
+        metrics.record_cache('example', False)
+        output = self.scrape()
+        self.assertIn('cache_lookups_total{cache="example",result="hit"}', output)
+        self.assertIn('cache_lookups_total{cache="example",result="miss"}', output)
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='budget', password='testpass123')
+
+    def test_query_shape_ignores_parameters(self):
+        self.assertEqual(
+            query_shape("SELECT * FROM t WHERE a = 1 AND b = 'x' AND c IN (%s, %s, %s)"),
+            query_shape("SELECT * FROM t WHERE a = 22 AND b = 'yy' AND c IN (%s)"),
+        )
+
+    def test_over_budget_request_raises_in_tests(self):
+        with mock.patch.object(PostViewSet, 'query_budget', {'list': 0}):
+            with self.assertRaisesMessage(QueryBudgetExceeded, 'over its budget of 0'):
+                self.client.get(reverse('post-list'))
+
+    @override_settings(QUERY_BUDGET_MODE='warn')
+    def test_over_budget_request_logs_in_production(self):
+        with mock.patch.object(PostViewSet, 'query_budget', {'list': 0}):
+            with self.assertLogs('social_media_api.querybudget', 'WARNING') as logs:
+                response = self.client.get(reverse('post-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('GET /api/posts/', logs.output[0])
+
+    def test_repeated_query_shapes_are_flagged(self):
+        def n_plus_one():
+            for user in User.objects.all():
+                list(User.objects.filter(pk=user.pk))
+
+        for i in range(3):
+            User.objects.create_user(username=f'extra{i}', password='testpass123')
+        with QueryRecorder() as recorder:
+            n_plus_one()
+        self.assertEqual(list(recorder.repeated_shapes().values()), [4])
+        with self.assertRaisesMessage(AssertionError, 'possible N+1'):
+            self.assertNoRepeatedQueries(n_plus_one)
@@ -19,6 +19,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 from .health_views import health_check, detailed_health_check
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -28,6 +29,8 @@ urlpatterns = [
     # Health check endpoints
     path('health/', health_check, name='health-check'),
     path('health/detailed/', detailed_health_check, name='detailed-health-check'),
+    # Prometheus metrics
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Serve media files during development